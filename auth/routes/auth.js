@@ -131,7 +131,7 @@ auth.openapi(createRoute({
           role: user.role 
         },
         meta: { ip: getRequestIp(c), timestamp: new Date().toISOString() }
-      })
+      }, { traceparent: c.req.header('traceparent') })
     } catch (err) {
       console.error('Error publicando evento user.created', err && err.message ? err.message : err)
     }
@@ -253,7 +253,7 @@ auth.openapi(createRoute({
         type: 'user.login',
         data: { id: row.id, username: row.username, email: row.email, role: row.role },
         meta: { ip: getRequestIp(c), timestamp: new Date().toISOString() }
-      })
+      }, { traceparent: c.req.header('traceparent') })
     } catch (err) {
       console.error('Error publicando evento user.login', err && err.message ? err.message : err)
     }
@@ -335,7 +335,7 @@ auth.openapi(createRoute({
           type: 'password.reset.requested',
           data: { userId, email, token },
           meta: { ip: getRequestIp(c), timestamp: new Date().toISOString() }
-        })
+        }, { traceparent: c.req.header('traceparent') })
       } catch (err) {
         console.error('Error publicando evento password.reset.requested', err && err.message ? err.message : err)
       }
@@ -127,7 +127,7 @@ users.openapi(createRoute({
       type: 'user.updated',
       data: { id: updated.rows[0].id, username: updated.rows[0].username, email: updated.rows[0].email },
       meta: { actor: decoded.uid, timestamp: new Date().toISOString() }
-    })
+    }, { traceparent: c.req.header('traceparent') })
   } catch (err) {
     console.error('Error publicando evento user.updated', err && err.message ? err.message : err)
   }
@@ -210,7 +210,7 @@ users.openapi(createRoute({
       type: 'password.updated',
       data: { userId, username, email, phone },
       meta: { actor: decoded.uid, timestamp: new Date().toISOString() }
-    })
+    }, { traceparent: c.req.header('traceparent') })
   } catch (err) {
     console.error('Error publicando evento password.updated', err && err.message ? err.message : err)
   }
@@ -389,7 +389,7 @@ users.openapi(createRoute({
         type: 'user.deleted',
         data: { id: targetUserId, username },
         meta: { actor: decoded.uid, timestamp: new Date().toISOString() }
-      })
+      }, { traceparent: c.req.header('traceparent') })
     } catch (err) {
       console.error('Error publicando evento user.deleted', err && err.message ? err.message : err)
     }
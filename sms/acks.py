@@ -0,0 +1,123 @@
+"""
+Confirmaciones AMQP agrupadas.
+
+Un basic_ack por mensaje es una trama por mensaje. AckCoalescer acumula los
+acks y, tras max_batch acks nuevos o max_delay segundos, confirma con un
+único basic_ack(multiple=True) el mayor prefijo contiguo de delivery tags ya
+completados. Con carriles los mensajes terminan desordenados: un tag aún en
+proceso corta el prefijo y los completados que quedan detrás esperan a
+unirse a él. Sólo si ese tag lleva más de max_block segundos pendiente (p. ej.
+un mensaje retenido) se confirman uno a uno, para no agotar el prefetch.
+
+Los nacks no se agrupan (se envían al momento). Todo corre en el hilo de
+la conexión de pika: desde los carriles se usa a través de ThreadsafeChannel.
+Si el proceso muere antes de vaciar, RabbitMQ reentrega lo no confirmado
+(como mucho max_delay segundos de trabajo).
+"""
+import collections
+import time
+
+from metrics import metrics
+
+_PENDING = 0
+_DONE = 1
+_SETTLED = 2
+
+
+class AckCoalescer:
+    """Proxy de canal que agrupa basic_ack; sólo para el hilo de pika"""
+
+    def __init__(self, channel, max_batch=50, max_delay=0.05, max_block=1.0, clock=time.monotonic):
+        self._channel = channel
+        self.connection = channel.connection
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_block = max_block
+        self.clock = clock
+        # Tags en orden de entrega, su estado y cuándo llegaron; acotado por el prefetch
+        self._order = collections.deque()
+        self._state = {}
+        self._since = {}
+        # Completados sin confirmar, y de ellos los llegados desde el último vaciado
+        self._ready = 0
+        self._fresh = 0
+        self._timer = None
+
+    def track(self, delivery_tag):
+        """Registrar una entrega; debe llamarse antes de que pueda completarse"""
+        self._order.append(delivery_tag)
+        self._state[delivery_tag] = _PENDING
+        self._since[delivery_tag] = self.clock()
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        if multiple or self._state.get(delivery_tag) != _PENDING:
+            # Fuera de lo registrado: no se puede agrupar con seguridad
+            self._channel.basic_ack(delivery_tag=delivery_tag, multiple=multiple)
+            return
+        self._state[delivery_tag] = _DONE
+        self._ready += 1
+        self._fresh += 1
+        if self._fresh >= self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = self.connection.call_later(self.max_delay, self._on_timer)
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        if delivery_tag in self._state and not multiple:
+            self._state[delivery_tag] = _SETTLED
+        self._channel.basic_nack(delivery_tag=delivery_tag, multiple=multiple, requeue=requeue)
+
+    def basic_publish(self, **kwargs):
+        self._channel.basic_publish(**kwargs)
+
+    def _on_timer(self):
+        self._timer = None
+        self.flush()
+
+    def flush(self, force=False):
+        """Confirmar el prefijo completado (con force, todo lo completado);
+        devuelve cuántas entregas se confirmaron"""
+        if self._timer is not None:
+            self.connection.remove_timeout(self._timer)
+            self._timer = None
+        self._fresh = 0
+        if not self._ready:
+            return 0
+
+        last = None
+        acked = 0
+        while self._order:
+            tag = self._order[0]
+            state = self._state[tag]
+            if state == _PENDING:
+                break
+            self._order.popleft()
+            del self._state[tag]
+            del self._since[tag]
+            if state == _DONE:
+                last = tag
+                acked += 1
+        frames = 0
+        if last is not None:
+            # multiple=True sólo afecta a tags sin confirmar: los ya nackeados no cambian
+            self._channel.basic_ack(delivery_tag=last, multiple=True)
+            frames += 1
+        self._ready -= acked
+
+        if self._ready:
+            # Completados detrás de un tag en proceso: esperan salvo que lleve demasiado
+            blocked = self.clock() - self._since[self._order[0]]
+            if force or blocked >= self.max_block:
+                for tag, state in self._state.items():
+                    if state == _DONE:
+                        self._state[tag] = _SETTLED
+                        self._channel.basic_ack(delivery_tag=tag)
+                        acked += 1
+                        frames += 1
+                self._ready = 0
+            else:
+                self._timer = self.connection.call_later(self.max_block - blocked, self._on_timer)
+
+        metrics.inc('sms_acks', acked)
+        metrics.inc('sms_ack_frames', frames)
+        return acked
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark de decodificación de mensajes SMS.
+
+Compara el camino anterior del consumer (body.decode() + json.loads + .get()
+encadenados) con codec.decode_message sobre los tipos de evento reales.
+
+Uso:
+    python benchmarks/bench_codec.py [iteraciones]
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import codec  # noqa: E402
+
+SAMPLES = {
+    'security.login': {
+        'type': 'security.login',
+        'recipient': '+573001234567',
+        'ip': '181.49.12.7',
+        'userId': 'b8c1d2e3-4f50-6172-8394-a5b6c7d8e9f0',
+        'timestamp': '2025-11-10T12:00:00Z'
+    },
+    'service.alert': {
+        'type': 'service.alert',
+        'service': 'auth',
+        'alert_name': 'HighLatency',
+        'instance': 'auth:3500',
+        'severity': 'critical',
+        'timestamp': '2025-11-10T12:00:00Z'
+    },
+    'direct': {
+        'to': '+573001234567',
+        'body': 'Mensaje directo de prueba con algo de contenido',
+        'type': 'notification'
+    },
+}
+
+
+def legacy_decode(body):
+    """Camino previo: decodificar a str, json.loads y sondear claves"""
+    event_data = json.loads(body.decode())
+    event_type = event_data.get('type')
+    if event_type == 'service.alert':
+        return (
+            event_data.get('service', 'unknown'),
+            event_data.get('alert_name', 'Alert'),
+            event_data.get('instance', ''),
+            event_data.get('severity', ''),
+            event_data.get('timestamp', '')
+        )
+    if event_type in ['account.created', 'security.login', 'security.password_change']:
+        return event_data.get('recipient'), event_data.get('message'), event_data.get('ip', 'IP desconocida')
+    recipient = event_data.get('recipient') or event_data.get('to')
+    message = event_data.get('message') or event_data.get('body') or event_data.get('text')
+    return recipient, message
+
+
+def run(iterations):
+    print(f'JSON backend: {codec.JSON_BACKEND}  iteraciones: {iterations}')
+    print(f"{'evento':<16}{'legacy (µs)':>14}{'codec (µs)':>14}{'speedup':>10}")
+    for name, sample in SAMPLES.items():
+        body = json.dumps(sample).encode()
+        legacy = timeit.timeit(lambda: legacy_decode(body), number=iterations)
+        typed = timeit.timeit(lambda: codec.decode_message(body), number=iterations)
+        legacy_us = legacy / iterations * 1e6
+        typed_us = typed / iterations * 1e6
+        print(f'{name:<16}{legacy_us:>14.2f}{typed_us:>14.2f}{legacy_us / typed_us:>9.2f}x')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
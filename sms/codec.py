@@ -0,0 +1,176 @@
+"""
+Decodificación tipada de mensajes SMS recibidos desde RabbitMQ.
+
+Convierte el cuerpo AMQP (bytes) en un registro por tipo de evento en una
+sola pasada: límite de tamaño antes de parsear, JSON rápido (orjson) si está
+disponible y validación de los campos que usa cada rama del consumer.
+"""
+import json
+import os
+from datetime import datetime
+
+try:
+    import orjson
+
+    def _loads(data):
+        return orjson.loads(data)
+
+    JSON_BACKEND = 'orjson'
+except ImportError:  # pragma: no cover - depende del entorno
+    _loads = json.loads
+    JSON_BACKEND = 'json'
+
+MAX_MESSAGE_BYTES = int(os.environ.get('SMS_MAX_MESSAGE_BYTES', str(64 * 1024)))
+
+ALERT_TYPE = 'service.alert'
+NOTIFICATION_TYPES = frozenset(['account.created', 'security.login', 'security.password_change'])
+
+
+class MessageError(ValueError):
+    """Error base de decodificación"""
+
+
+class MalformedMessage(MessageError):
+    """El cuerpo no es JSON válido, excede el tamaño o no es un objeto"""
+
+
+class InvalidMessage(MessageError):
+    """El JSON es válido pero no cumple el esquema del tipo de evento"""
+
+    def __init__(self, message, data=None, field=None):
+        super().__init__(message)
+        self.data = data
+        self.field = field
+
+
+class AlertEvent:
+    """Alerta de servicio (type o routing key 'service.alert')"""
+
+    __slots__ = ('type', 'service', 'alert_name', 'instance', 'severity', 'timestamp', 'expires_at', 'raw')
+
+    # Las alertas nunca se programan ni respetan horario de silencio
+    urgent = True
+
+    def __init__(self, raw):
+        self.type = raw.get('type')
+        self.service = raw.get('service', 'unknown')
+        self.alert_name = raw.get('alert_name', 'Alert')
+        self.instance = raw.get('instance', '')
+        self.severity = raw.get('severity', '')
+        self.timestamp = raw.get('timestamp', '')
+        self.expires_at = _time(raw, 'expires_at')
+        self.raw = raw
+
+
+class NotificationEvent:
+    """Notificación de cuenta/seguridad publicada por auth"""
+
+    __slots__ = ('type', 'recipient', 'message', 'ip', 'send_at', 'not_before', 'expires_at', 'urgent', 'raw')
+
+    def __init__(self, raw):
+        self.type = raw['type']
+        self.recipient = _text(raw, 'recipient')
+        self.message = _text(raw, 'message')
+        self.ip = raw.get('ip', 'IP desconocida')
+        self.send_at = _time(raw, 'send_at')
+        self.not_before = _time(raw, 'not_before')
+        self.expires_at = _time(raw, 'expires_at')
+        self.urgent = bool(raw.get('urgent', False))
+        self.raw = raw
+        if not self.recipient:
+            raise InvalidMessage('Evento normal sin recipient', raw, 'recipient')
+
+
+class DirectMessage:
+    """Mensaje directo con estructura simple (recipient/to, message/body/text)"""
+
+    __slots__ = ('type', 'recipient', 'message', 'send_at', 'not_before', 'expires_at', 'urgent', 'raw')
+
+    def __init__(self, raw):
+        self.type = raw.get('type')
+        self.recipient = _text(raw, 'recipient') or _text(raw, 'to')
+        self.message = _text(raw, 'message') or _text(raw, 'body') or _text(raw, 'text')
+        self.send_at = _time(raw, 'send_at')
+        self.not_before = _time(raw, 'not_before')
+        self.expires_at = _time(raw, 'expires_at')
+        self.urgent = bool(raw.get('urgent', False))
+        self.raw = raw
+        if not self.recipient or not self.message:
+            field = 'recipient' if not self.recipient else 'message'
+            raise InvalidMessage('Estructura de mensaje no reconocida', raw, field)
+
+
+def _text(raw, field):
+    """Leer un campo opcional de texto validando su tipo"""
+    value = raw.get(field)
+    if value is None or isinstance(value, str):
+        return value
+    raise InvalidMessage(
+        f"Campo '{field}' debe ser texto, se recibió {type(value).__name__}",
+        raw,
+        field
+    )
+
+
+def _time(raw, field):
+    """Leer un instante opcional (ISO 8601 o epoch en s/ms) como epoch en segundos"""
+    value = raw.get(field)
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # Epoch en milisegundos (Date.now() en auth)
+        return value / 1000.0 if value > 1e11 else float(value)
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            pass
+        else:
+            if parsed.tzinfo is None:
+                raise InvalidMessage(f"Campo '{field}' requiere zona horaria: {value}", raw, field)
+            return parsed.timestamp()
+    raise InvalidMessage(f"Campo '{field}' no es una fecha válida: {value!r}", raw, field)
+
+
+def body_text(body):
+    """Representación de texto del cuerpo para logs"""
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        return bytes(body).decode('utf-8', errors='replace')
+    return body
+
+
+def decode_message(body, routing_key=''):
+    """Decodificar el cuerpo AMQP en un registro tipado"""
+    if isinstance(body, str):
+        data = body.encode('utf-8')
+    elif isinstance(body, (bytes, bytearray, memoryview)):
+        data = body
+    else:
+        raise MalformedMessage(f'Tipo de cuerpo no soportado: {type(body).__name__}')
+
+    if len(data) > MAX_MESSAGE_BYTES:
+        raise MalformedMessage(
+            f'Mensaje de {len(data)} bytes excede el límite de {MAX_MESSAGE_BYTES} bytes'
+        )
+
+    try:
+        raw = _loads(data)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise MalformedMessage(str(e)) from e
+
+    if not isinstance(raw, dict):
+        raise MalformedMessage(f'Se esperaba un objeto JSON, se recibió {type(raw).__name__}')
+
+    event_type = raw.get('type')
+    if event_type is not None and not isinstance(event_type, str):
+        raise InvalidMessage(
+            f"Campo 'type' debe ser texto, se recibió {type(event_type).__name__}",
+            raw,
+            'type'
+        )
+
+    if event_type == ALERT_TYPE or routing_key == ALERT_TYPE:
+        return AlertEvent(raw)
+    if event_type in NOTIFICATION_TYPES:
+        return NotificationEvent(raw)
+    return DirectMessage(raw)
@@ -0,0 +1,229 @@
+"""
+Configuración de ejecución recargable desde Consul KV.
+
+Los valores parten del entorno y se sobrescriben con las claves bajo
+SMS_CONFIG_PREFIX (por defecto config/sms/):
+
+    alert_recipient            destinatario de las alertas de servicio
+    prefetch_count             mensajes en vuelo (basic_qos)
+    rate_limits                políticas 'tipo=límite/ventana:acción,...'
+    segment_budgets            presupuestos 'tipo=segmentos,...'
+    templates/<tipo_evento>    plantilla del SMS ({ip}, {alert_name}...)
+    queue, routing_key         topología: sólo se aplican al arrancar
+
+Un hilo vigila el prefijo con consultas bloqueantes (índice X-Consul-Index).
+Cada cambio se valida completo y se publica como un Settings inmutable
+nuevo: o se aplica todo o nada, y el camino caliente sólo lee
+store.current, sin E/S ni bloqueos.
+"""
+import os
+import threading
+
+from metrics import metrics
+from ratelimit import DEFAULT_POLICIES, parse_policies
+from segments import DEFAULT_SEGMENT_BUDGETS, parse_budgets as parse_segment_budgets
+
+PREFIX = os.environ.get('SMS_CONFIG_PREFIX', 'config/sms/')
+WATCH_WAIT = os.environ.get('SMS_CONFIG_WAIT', '55s')
+MAX_BACKOFF = float(os.environ.get('SMS_CONFIG_MAX_BACKOFF', '60'))
+
+TEMPLATE_PREFIX = 'templates/'
+RESTART_KEYS = frozenset(['queue', 'routing_key'])
+
+DEFAULT_TEMPLATES = {
+    'service.alert': (
+        '🚨 ALERTA: {alert_name}\n'
+        'Servicio: {service}\n'
+        'Severidad: {severity}\n'
+        'Instancia: {instance}\n'
+        'Tiempo: {timestamp}'
+    ),
+    'account.created': '¡Bienvenido! Tu cuenta ha sido creada exitosamente.',
+    'security.login': 'Alerta: Nuevo acceso a tu cuenta desde {ip}',
+    'security.password_change': 'Tu contraseña ha sido cambiada exitosamente',
+}
+
+
+class ConfigError(ValueError):
+    """Valor de configuración inválido; la instantánea anterior sigue vigente"""
+
+
+class _Fields(dict):
+    """Campos de plantilla; los desconocidos se dejan tal cual"""
+
+    def __missing__(self, key):
+        return '{' + key + '}'
+
+
+class Settings:
+    """Instantánea de la configuración; se reemplaza entera, nunca se modifica"""
+
+    __slots__ = (
+        'alert_recipient', 'prefetch_count', 'rate_limits', 'segment_budgets',
+        'templates', 'queue', 'routing_key', 'index'
+    )
+
+    def __init__(self, raw, index=0):
+        templates = dict(DEFAULT_TEMPLATES)
+        for key, value in raw.items():
+            if key.startswith(TEMPLATE_PREFIX):
+                templates[key[len(TEMPLATE_PREFIX):]] = _template(key, value)
+
+        self.alert_recipient = raw.get('alert_recipient') or None
+        self.prefetch_count = _positive_int(raw, 'prefetch_count')
+        self.rate_limits = _parsed(raw, 'rate_limits', parse_policies)
+        self.segment_budgets = _parsed(raw, 'segment_budgets', parse_segment_budgets)
+        self.templates = templates
+        self.queue = raw['queue']
+        self.routing_key = raw['routing_key']
+        self.index = index
+
+    def render(self, event_type, **fields):
+        """Texto del SMS para event_type, o None si no hay plantilla"""
+        template = self.templates.get(event_type)
+        if template is None:
+            return None
+        return template.format_map(_Fields(fields))
+
+
+def _positive_int(raw, key):
+    try:
+        value = int(raw[key])
+    except (TypeError, ValueError):
+        raise ConfigError(f'{key}: se esperaba un entero') from None
+    if value < 1:
+        raise ConfigError(f'{key}: debe ser mayor que 0')
+    return value
+
+
+def _parsed(raw, key, parser):
+    try:
+        return parser(raw[key])
+    except (TypeError, ValueError) as e:
+        raise ConfigError(f'{key}: {e}') from None
+
+
+def _template(key, value):
+    try:
+        value.format_map(_Fields())
+    except (ValueError, IndexError) as e:
+        raise ConfigError(f'{key}: {e}') from None
+    return value
+
+
+def defaults_from_env():
+    """Valores iniciales (texto, como en KV) tomados del entorno"""
+    return {
+        'alert_recipient': (
+            os.environ.get('ALERT_SMS_RECIPIENT') or
+            os.environ.get('SMS_DEFAULT_RECIPIENT') or
+            '+573001234567'  # fallback para testing
+        ),
+        'prefetch_count': os.environ.get('SMS_PREFETCH_COUNT', '1'),
+        'rate_limits': os.environ.get('SMS_RATE_LIMITS', DEFAULT_POLICIES),
+        'segment_budgets': os.environ.get('SMS_SEGMENT_BUDGETS', DEFAULT_SEGMENT_BUDGETS),
+        'queue': os.environ.get('MESSAGING_SMS_QUEUE', 'messaging.sms.queue'),
+        'routing_key': os.environ.get('SEND_SMS_ROUTING_KEY', 'send.sms'),
+    }
+
+
+class ConfigStore:
+    """Instantánea vigente + vigilancia de Consul KV en segundo plano"""
+
+    def __init__(self, defaults, prefix=PREFIX, wait=WATCH_WAIT, max_backoff=MAX_BACKOFF, on_error=None):
+        self.defaults = dict(defaults)
+        self.prefix = prefix
+        self.wait = wait
+        self.max_backoff = max_backoff
+        self.on_error = on_error
+        self.client = None
+        self.index = 0
+        self._raw = dict(self.defaults)
+        self.current = Settings(self._raw)
+        self._listeners = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, listener):
+        """listener(new, old, changed_keys) tras cada cambio aplicado"""
+        self._listeners.append(listener)
+
+    def _error(self, message, payload):
+        metrics.inc('sms_config_errors')
+        if self.on_error:
+            self.on_error(message, payload)
+
+    def apply(self, entries, index):
+        """Construir y publicar la instantánea de las entradas KV; False si se rechaza"""
+        raw = dict(self.defaults)
+        for entry in entries or ():
+            key = entry['Key'][len(self.prefix):]
+            value = entry.get('Value')
+            if not key or key.endswith('/') or value is None:
+                continue
+            raw[key] = value.decode('utf-8') if isinstance(value, bytes) else value
+
+        changed = {k for k in raw.keys() | self._raw.keys() if raw.get(k) != self._raw.get(k)}
+        if not changed:
+            return True
+        try:
+            settings = Settings(raw, index)
+        except ConfigError as e:
+            metrics.inc('sms_config_rejected')
+            self._error('Configuración rechazada', {'error': str(e), 'index': index})
+            return False
+
+        old, self.current, self._raw = self.current, settings, raw
+        metrics.inc('sms_config_reloads')
+        metrics.set('sms_config_index', index)
+        for listener in list(self._listeners):
+            try:
+                listener(settings, old, changed)
+            except Exception as e:
+                self._error('Error aplicando configuración', {'error': str(e), 'keys': sorted(changed)})
+        return True
+
+    def load(self, client):
+        """Lectura inicial no bloqueante; si Consul falla se siguen usando los valores de entorno"""
+        self.client = client
+        try:
+            index, entries = client.kv.get(self.prefix, recurse=True)
+        except Exception as e:
+            self._error('Consul KV no disponible, usando configuración de entorno', {'error': str(e)})
+            return False
+        self.index = int(index or 0)
+        return self.apply(entries, self.index)
+
+    def poll(self):
+        """Una consulta bloqueante; vuelve al cambiar el prefijo o al expirar wait"""
+        index, entries = self.client.kv.get(self.prefix, recurse=True, index=self.index or None, wait=self.wait)
+        index = int(index or 0)
+        if index < self.index:
+            # El índice retrocede tras restaurar Consul: empezar de nuevo
+            self.index = 0
+            return
+        if index == self.index:
+            return
+        self.index = index
+        self.apply(entries, index)
+
+    def _watch(self):
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                self.poll()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                if failures == 1:
+                    self._error('Error vigilando Consul KV', {'error': str(e)})
+                self._stop.wait(min(2 ** failures, self.max_backoff))
+
+    def start(self):
+        if self.client is None or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._watch, name='sms-config-watch', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
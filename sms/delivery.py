@@ -0,0 +1,219 @@
+"""
+Callbacks de estado de Twilio: firma, buffer y agregación por lotes.
+
+POST /twilio/status (message.py) sólo valida la firma y encola el cambio de
+estado en un deque en memoria; un hilo por worker vacía el buffer cada
+SMS_STATUS_FLUSH_INTERVAL y agrega:
+
+- latencia sent → delivered (histograma) por prefijo de operador y tipo de
+  evento
+- conteos de estados y de códigos de error (failed/undelivered)
+
+El tipo de evento viaja en la URL de callback (?event_type=...) que el
+proveedor Twilio añade a cada envío. Si el buffer se llena se descartan
+actualizaciones nuevas en vez de bloquear la respuesta a Twilio.
+"""
+import base64
+import collections
+import hashlib
+import hmac
+import os
+import threading
+import time
+import urllib.parse
+
+from metrics import Histogram
+
+LATENCY_BUCKETS = (1, 2, 5, 10, 30, 60, 120, 300, 900, 3600)
+
+SENT = 'sent'
+DELIVERED = 'delivered'
+FAILED = ('failed', 'undelivered')
+
+
+def callback_url(base, event_type):
+    """URL de StatusCallback con el tipo de evento como parámetro"""
+    if not event_type:
+        return base
+    separator = '&' if '?' in base else '?'
+    return f'{base}{separator}{urllib.parse.urlencode({"event_type": event_type})}'
+
+
+class SignatureValidator:
+    """X-Twilio-Signature: HMAC-SHA1 en base64 de la URL + parámetros ordenados"""
+
+    def __init__(self, auth_token):
+        # La clave se procesa una sola vez; cada petición copia el estado
+        self._mac = hmac.new(auth_token.encode('utf-8'), digestmod=hashlib.sha1)
+
+    def expected(self, url, params):
+        mac = self._mac.copy()
+        mac.update(url.encode('utf-8'))
+        for key in sorted(params):
+            mac.update(key.encode('utf-8'))
+            mac.update(params[key].encode('utf-8'))
+        return base64.b64encode(mac.digest()).decode('ascii')
+
+    def valid(self, url, params, signature):
+        if not signature:
+            return False
+        return hmac.compare_digest(self.expected(url, params), signature)
+
+
+class StatusUpdate:
+    """Un callback de estado tal como llegó"""
+
+    __slots__ = ('sid', 'status', 'to', 'error_code', 'event_type', 'received_at')
+
+    def __init__(self, sid, status, to=None, error_code=None, event_type=None, received_at=None):
+        self.sid = sid
+        self.status = status
+        self.to = to
+        self.error_code = error_code
+        self.event_type = event_type
+        self.received_at = received_at
+
+
+class StatusAggregator:
+    """Buffer sin bloqueo en la petición y agregados actualizados por lotes"""
+
+    def __init__(self, max_pending=100000, flush_interval=1.0, report_interval=60.0,
+                 prefix_length=6, max_tracked=200000, clock=time.time, on_report=None):
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.report_interval = report_interval
+        self.prefix_length = prefix_length
+        self.max_tracked = max_tracked
+        self.clock = clock
+        self.on_report = on_report
+        self.dropped = 0
+        self.processed = 0
+        # append/popleft de deque son atómicos: la petición no toma locks
+        self._pending = collections.deque()
+        # sid -> (estado, instante) del primer estado visto de sent/delivered
+        self._seen = collections.OrderedDict()
+        self._latency = {}
+        self._statuses = {}
+        self._failures = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def submit(self, update):
+        """Encolar sin esperar; False si el buffer está lleno"""
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return False
+        if update.received_at is None:
+            update.received_at = self.clock()
+        self._pending.append(update)
+        if self._pid != os.getpid():
+            self.start()
+        return True
+
+    def start(self):
+        """Arrancar el flusher; los hilos no sobreviven al fork de gunicorn"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sms-status-flusher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+    def _run(self):
+        next_report = time.monotonic() + self.report_interval
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+            if self.on_report and time.monotonic() >= next_report:
+                next_report += self.report_interval
+                self.on_report(self.snapshot())
+
+    def _prefix(self, number):
+        return (number or 'unknown')[:self.prefix_length]
+
+    def _track(self, update):
+        """Latencia sent → delivered; los callbacks pueden llegar desordenados"""
+        previous = self._seen.pop(update.sid, None)
+        if previous is None:
+            self._seen[update.sid] = (update.status, update.received_at)
+            if len(self._seen) > self.max_tracked:
+                self._seen.popitem(last=False)
+            return None
+        status, at = previous
+        if status == update.status:
+            self._seen[update.sid] = previous
+            return None
+        return abs(update.received_at - at)
+
+    def flush(self):
+        """Agregar lo encolado hasta ahora; devuelve cuántas actualizaciones"""
+        batch = []
+        for _ in range(len(self._pending)):
+            batch.append(self._pending.popleft())
+        if not batch:
+            return 0
+
+        with self._lock:
+            for update in batch:
+                group = (self._prefix(update.to), update.event_type or 'unknown')
+                key = group + (update.status,)
+                self._statuses[key] = self._statuses.get(key, 0) + 1
+
+                if update.status in (SENT, DELIVERED):
+                    latency = self._track(update)
+                    if latency is not None:
+                        hist = self._latency.get(group)
+                        if hist is None:
+                            hist = self._latency[group] = Histogram(LATENCY_BUCKETS)
+                        hist.observe(latency)
+                elif update.status in FAILED:
+                    self._seen.pop(update.sid, None)
+                    key = group + (update.error_code or 'none',)
+                    self._failures[key] = self._failures.get(key, 0) + 1
+            self.processed += len(batch)
+        return len(batch)
+
+    def snapshot(self):
+        """Copia serializable de los agregados"""
+        with self._lock:
+            return {
+                'processed': self.processed,
+                'pending': len(self._pending),
+                'dropped': self.dropped,
+                'latency_seconds': [
+                    {'prefix': prefix, 'event_type': event_type, **hist.to_dict()}
+                    for (prefix, event_type), hist in self._latency.items()
+                ],
+                'statuses': [
+                    {'prefix': prefix, 'event_type': event_type, 'status': status, 'count': count}
+                    for (prefix, event_type, status), count in self._statuses.items()
+                ],
+                'failures': [
+                    {'prefix': prefix, 'event_type': event_type, 'error_code': code, 'count': count}
+                    for (prefix, event_type, code), count in self._failures.items()
+                ]
+            }
+
+
+def aggregator_from_env(on_report=None):
+    """Crear el agregador según SMS_STATUS_*"""
+    return StatusAggregator(
+        max_pending=int(os.environ.get('SMS_STATUS_BUFFER_SIZE', '100000')),
+        flush_interval=float(os.environ.get('SMS_STATUS_FLUSH_INTERVAL', '1.0')),
+        report_interval=float(os.environ.get('SMS_STATUS_REPORT_INTERVAL', '60')),
+        prefix_length=int(os.environ.get('SMS_STATUS_PREFIX_LENGTH', '6')),
+        max_tracked=int(os.environ.get('SMS_STATUS_MAX_TRACKED', '200000')),
+        on_report=on_report
+    )
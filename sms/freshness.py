@@ -0,0 +1,120 @@
+"""
+Control de antigüedad de mensajes y modo de descarte ante backlog.
+
+Cada tipo de evento tiene un presupuesto de frescura: un "Nuevo acceso a tu
+cuenta" de hace horas ya no sirve. La antigüedad se mide desde la
+publicación (cabecera x-published-at o timestamp AMQP) o desde send_at si
+el mensaje estaba programado; expires_at en el cuerpo fija un límite
+absoluto. Con la cola por encima de los umbrales de profundidad o retraso,
+el monitor activa el modo shedding: presupuestos más estrictos y descarte
+de los tipos de evento no esenciales.
+"""
+import os
+
+DEFAULT_BUDGETS = (
+    'security.login=900,security.password_change=3600,account.created=86400,'
+    'service.alert=1800,*=86400'
+)
+
+
+def parse_budgets(raw):
+    """Parsear 'tipo=segundos,...' ('*' aplica al resto)"""
+    budgets = {}
+    for item in (raw or '').split(','):
+        if '=' not in item:
+            continue
+        event_type, _, seconds = item.partition('=')
+        budgets[event_type.strip()] = float(seconds)
+    return budgets
+
+
+class FreshnessPolicy:
+    """Presupuestos de antigüedad por tipo de evento"""
+
+    def __init__(self, budgets, shed_factor=0.25, shed_drop_events=()):
+        self.budgets = budgets
+        self.shed_factor = shed_factor
+        self.shed_drop_events = frozenset(shed_drop_events)
+
+    def budget_for(self, event_type, shedding=False):
+        budget = self.budgets.get(event_type, self.budgets.get('*'))
+        if budget is not None and shedding:
+            budget *= self.shed_factor
+        return budget
+
+    def stale_reason(self, event, published_at, now, shedding=False):
+        """Motivo para descartar el evento, o None si sigue vigente"""
+        expires_at = getattr(event, 'expires_at', None)
+        if expires_at is not None and now >= expires_at:
+            return 'expired'
+
+        if shedding and event.type in self.shed_drop_events:
+            return 'shedding'
+
+        # Un mensaje programado empieza a envejecer cuando vence, no al publicarse
+        reference = max(
+            (t for t in (published_at, getattr(event, 'send_at', None), getattr(event, 'not_before', None))
+             if t is not None),
+            default=None
+        )
+        if reference is None:
+            return None
+        budget = self.budget_for(event.type, shedding)
+        if budget is not None and now - reference > budget:
+            return 'stale'
+        return None
+
+
+class BacklogMonitor:
+    """Activa el modo shedding según profundidad de cola y retraso de consumo"""
+
+    def __init__(self, max_depth, max_lag, recover_ratio=0.5, alpha=0.2):
+        self.max_depth = max_depth
+        self.max_lag = max_lag
+        self.recover_ratio = recover_ratio
+        self.alpha = alpha
+        self.depth = 0
+        self.lag = 0.0
+        self.shedding = False
+
+    def observe_lag(self, lag):
+        """Promedio exponencial del retraso publicación → consumo"""
+        self.lag += self.alpha * (max(lag, 0.0) - self.lag)
+
+    def update_depth(self, depth):
+        """Actualizar profundidad; devuelve True si cambió el modo"""
+        self.depth = depth
+        if depth == 0:
+            # Cola vacía: nada espera; el promedio sólo se mueve con cada mensaje
+            # y con poco tráfico mantendría el modo shedding
+            self.lag = 0.0
+        return self.evaluate()
+
+    def evaluate(self):
+        over = self.depth > self.max_depth or self.lag > self.max_lag
+        # Histéresis: salir sólo con holgura para no oscilar
+        under = (self.depth <= self.max_depth * self.recover_ratio
+                 and self.lag <= self.max_lag * self.recover_ratio)
+        previous = self.shedding
+        if over:
+            self.shedding = True
+        elif under:
+            self.shedding = False
+        return self.shedding != previous
+
+
+# Configuración desde entorno
+QUEUE_TTL_MS = int(os.environ.get('SMS_QUEUE_TTL_MS', str(24 * 3600 * 1000)))
+BACKLOG_POLL_INTERVAL = float(os.environ.get('SMS_BACKLOG_POLL_INTERVAL', '5'))
+
+freshness = FreshnessPolicy(
+    parse_budgets(os.environ.get('SMS_FRESHNESS_BUDGETS', DEFAULT_BUDGETS)),
+    shed_factor=float(os.environ.get('SMS_SHED_FRESHNESS_FACTOR', '0.25')),
+    shed_drop_events=[
+        t.strip() for t in os.environ.get('SMS_SHED_DROP_EVENTS', '').split(',') if t.strip()
+    ]
+)
+backlog = BacklogMonitor(
+    max_depth=int(os.environ.get('SMS_SHED_MAX_DEPTH', '5000')),
+    max_lag=float(os.environ.get('SMS_SHED_MAX_LAG', '300'))
+)
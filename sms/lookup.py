@@ -0,0 +1,253 @@
+"""
+Validación de destinatarios antes de enviar, con caché persistente.
+
+Un número mal normalizado (fijo, inexistente) cuesta una llamada a Twilio y
+un error; la validación consulta el tipo de línea una sola vez por número
+(Twilio Lookup o una versión local para pruebas) y guarda el veredicto:
+
+- memoria: LRU acotada, sin E/S (microsegundos)
+- disco: SQLite en modo WAL, sobrevive reinicios; las claves son hashes del
+  número, no el número en claro
+
+Los resultados válidos y los rechazos tienen TTL distintos; si el proveedor
+de lookup falla el mensaje se envía igual (fail-open) y no se cachea nada.
+"""
+import collections
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from twilio.base.exceptions import TwilioException, TwilioRestException
+
+from metrics import metrics
+
+E164_RE = re.compile(r'^\+[1-9]\d{6,14}$')
+
+MODES = ('off', 'fallback', 'all')
+
+
+class LookupFailed(Exception):
+    """El proveedor de lookup no respondió; no dice nada del número"""
+
+
+class LookupResult:
+    """Veredicto del proveedor para un número"""
+
+    __slots__ = ('valid', 'line_type', 'carrier', 'expires_at')
+
+    def __init__(self, valid, line_type=None, carrier=None, expires_at=None):
+        self.valid = valid
+        self.line_type = line_type
+        self.carrier = carrier
+        self.expires_at = expires_at
+
+
+class Verdict:
+    """Decisión de envío para un destinatario"""
+
+    __slots__ = ('deliverable', 'reason', 'line_type', 'source')
+
+    def __init__(self, deliverable, reason=None, line_type=None, source=None):
+        self.deliverable = deliverable
+        self.reason = reason
+        self.line_type = line_type
+        self.source = source
+
+
+# ======================================
+# Proveedores de lookup
+# ======================================
+
+class TwilioLookup:
+    """Twilio Lookup v2 con line_type_intelligence"""
+
+    def __init__(self, client_getter):
+        self.client_getter = client_getter
+
+    def lookup(self, number):
+        client = self.client_getter()
+        if client is None:
+            raise LookupFailed('Twilio no configurado')
+        try:
+            info = client.lookups.v2.phone_numbers(number).fetch(fields='line_type_intelligence')
+        except TwilioRestException as e:
+            if e.status == 404:
+                return LookupResult(False)
+            raise LookupFailed(str(e)) from e
+        except TwilioException as e:
+            raise LookupFailed(str(e)) from e
+        line = getattr(info, 'line_type_intelligence', None) or {}
+        return LookupResult(bool(getattr(info, 'valid', True)), line.get('type'), line.get('carrier_name'))
+
+
+class LocalLookup:
+    """Reglas offline: E.164 y numeración colombiana (móviles 3xx, fijos 60x)"""
+
+    def lookup(self, number):
+        if not E164_RE.match(number):
+            return LookupResult(False)
+        if number.startswith('+57'):
+            national = number[3:]
+            if len(national) != 10:
+                return LookupResult(False)
+            if national.startswith('3'):
+                return LookupResult(True, 'mobile')
+            if national.startswith('60'):
+                return LookupResult(True, 'landline')
+            return LookupResult(False)
+        return LookupResult(True, None)
+
+
+# ======================================
+# Caché en dos niveles
+# ======================================
+
+def _key(number):
+    return hashlib.blake2b(number.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class LookupCache:
+    """LRU en memoria delante de una tabla SQLite con expiración"""
+
+    def __init__(self, path, memory_size=50000, clock=time.time):
+        self.memory_size = memory_size
+        self.clock = clock
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS lookups ('
+            ' key TEXT PRIMARY KEY, valid INTEGER NOT NULL, line_type TEXT,'
+            ' carrier TEXT, expires_at REAL NOT NULL)'
+        )
+
+    def _remember(self, key, result):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, number):
+        """(resultado, nivel) con nivel 'memory', 'disk' o 'miss'"""
+        key = _key(number)
+        now = self.clock()
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                if result.expires_at > now:
+                    self._memory.move_to_end(key)
+                    return result, 'memory'
+                del self._memory[key]
+
+            row = self._db.execute(
+                'SELECT valid, line_type, carrier, expires_at FROM lookups WHERE key = ? AND expires_at > ?',
+                (key, now)
+            ).fetchone()
+            if row is None:
+                return None, 'miss'
+            result = LookupResult(bool(row[0]), row[1], row[2], row[3])
+            self._remember(key, result)
+            return result, 'disk'
+
+    def put(self, number, result, ttl):
+        key = _key(number)
+        result.expires_at = self.clock() + ttl
+        with self._lock:
+            self._remember(key, result)
+            self._db.execute(
+                'INSERT OR REPLACE INTO lookups (key, valid, line_type, carrier, expires_at) VALUES (?, ?, ?, ?, ?)',
+                (key, int(result.valid), result.line_type, result.carrier, result.expires_at)
+            )
+
+    def purge(self):
+        """Borrar entradas vencidas del disco; devuelve cuántas"""
+        with self._lock:
+            return self._db.execute('DELETE FROM lookups WHERE expires_at <= ?', (self.clock(),)).rowcount
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class RecipientValidator:
+    """Decide si un destinatario merece un intento de envío"""
+
+    def __init__(self, provider, cache, mode='all', reject_line_types=('landline',),
+                 ttl=30 * 86400, negative_ttl=7 * 86400):
+        self.provider = provider
+        self.mode = mode
+        self.cache = cache
+        self.reject_line_types = frozenset(reject_line_types)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+    def applies(self, normalized):
+        """En modo 'fallback' sólo se validan los números completados con +57"""
+        return self.mode == 'all' or normalized
+
+    def _verdict(self, result, source):
+        if not result.valid:
+            return Verdict(False, 'invalid', result.line_type, source)
+        if result.line_type in self.reject_line_types:
+            return Verdict(False, 'line_type', result.line_type, source)
+        return Verdict(True, None, result.line_type, source)
+
+    def check(self, number):
+        try:
+            result, tier = self.cache.get(number)
+        except sqlite3.Error:
+            # Disco lleno o corrupto: degradar a consultas sin caché
+            metrics.inc('sms_lookup_cache_errors')
+            result, tier = None, 'miss'
+        metrics.inc('sms_lookup_cache', tier=tier)
+        if result is not None:
+            return self._verdict(result, tier)
+
+        try:
+            result = self.provider.lookup(number)
+        except LookupFailed as e:
+            metrics.inc('sms_lookup_errors')
+            return Verdict(True, str(e), None, 'error')
+
+        verdict = self._verdict(result, 'provider')
+        try:
+            self.cache.put(number, result, self.ttl if verdict.deliverable else self.negative_ttl)
+        except sqlite3.Error:
+            metrics.inc('sms_lookup_cache_errors')
+        return verdict
+
+
+def validator_from_env(twilio_client_getter):
+    """RecipientValidator según SMS_LOOKUP_*, o None si está deshabilitado"""
+    mode = os.environ.get('SMS_LOOKUP_MODE', 'off')
+    if mode not in MODES:
+        raise ValueError(f'SMS_LOOKUP_MODE inválido: {mode}')
+    if mode == 'off':
+        return None
+    provider_name = os.environ.get('SMS_LOOKUP_PROVIDER', 'twilio')
+    if provider_name == 'twilio':
+        provider = TwilioLookup(twilio_client_getter)
+    elif provider_name == 'local':
+        provider = LocalLookup()
+    else:
+        raise ValueError(f'SMS_LOOKUP_PROVIDER inválido: {provider_name}')
+    cache = LookupCache(
+        os.environ.get('SMS_LOOKUP_CACHE_PATH', '/tmp/sms-lookup.db'),
+        memory_size=int(os.environ.get('SMS_LOOKUP_MEMORY_SIZE', '50000'))
+    )
+    cache.purge()
+    return RecipientValidator(
+        provider,
+        cache,
+        mode=mode,
+        reject_line_types=[
+            t.strip() for t in os.environ.get('SMS_LOOKUP_REJECT_TYPES', 'landline').split(',') if t.strip()
+        ],
+        ttl=float(os.environ.get('SMS_LOOKUP_TTL', str(30 * 86400))),
+        negative_ttl=float(os.environ.get('SMS_LOOKUP_NEGATIVE_TTL', str(7 * 86400)))
+    )
@@ -7,8 +7,12 @@ import json
 import sys
 import logging
 import re
+import hmac
+import time
 from twilio.rest import Client
 from twilio.base.exceptions import TwilioException
+from profiling import Profiler, MODES, MAX_SECONDS
+from delivery import SignatureValidator, StatusUpdate, aggregator_from_env
 
 app = Flask(__name__)
 
@@ -55,6 +59,8 @@ TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
 TWILIO_PHONE_NUMBER = os.environ.get('TWILIO_PHONE_NUMBER')
 PORT = int(os.environ.get('MESSAGING_PORT', 6379))
+PROFILING_TOKEN = os.environ.get('SMS_PROFILING_TOKEN')
+STATUS_CALLBACK_URL = os.environ.get('SMS_STATUS_CALLBACK_URL')
 
 # Initialize Twilio client
 twilio_client = None
@@ -64,6 +70,17 @@ if TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN:
     except Exception as e:
         log_json('ERROR', 'Failed to initialize Twilio client', payload={'error': str(e)})
 
+# Status callbacks are only accepted when we can verify Twilio's signature
+signature_validator = SignatureValidator(TWILIO_AUTH_TOKEN) if TWILIO_AUTH_TOKEN else None
+status_aggregator = aggregator_from_env(
+    on_report=lambda stats: log_json('INFO', 'Delivery status report', payload=stats)
+)
+
+profiler = Profiler(
+    prefix='http',
+    on_complete=lambda paths, info: log_json('INFO', 'Profile captured', payload={'files': paths, **info})
+)
+
 def get_uptime():
     """Calculate service uptime"""
     delta = datetime.utcnow() - START_TIME
@@ -101,6 +118,14 @@ def get_memory_info():
         "vms": f"{mem_info.vms / (1024 * 1024):.2f} MB"
     }
 
+def public_url():
+    """URL Twilio signed; behind a proxy request.url has another scheme/host"""
+    if not STATUS_CALLBACK_URL:
+        return request.url
+    query = request.query_string.decode('utf-8')
+    base = STATUS_CALLBACK_URL.split('?', 1)[0]
+    return f"{base}?{query}" if query else base
+
 def validate_phone_number(phone):
     """Validate phone number format"""
     pattern = r'^\+[1-9]\d{1,14}$'
@@ -216,6 +241,67 @@ def health_live():
     
     return jsonify(response), 200
 
+@app.route('/debug/profile', methods=['POST'])
+def debug_profile():
+    """Start a time-boxed profile of this worker (disabled unless SMS_PROFILING_TOKEN is set)"""
+    if not PROFILING_TOKEN:
+        return jsonify({"error": "Not found"}), 404
+    token = request.headers.get('X-Profile-Token', '')
+    if not hmac.compare_digest(token, PROFILING_TOKEN):
+        return jsonify({"error": "Forbidden"}), 403
+
+    mode = request.args.get('mode', 'sample')
+    if mode not in MODES:
+        return jsonify({"error": f"Unsupported mode: {mode}"}), 400
+    try:
+        seconds = float(request.args.get('seconds', profiler.duration))
+    except ValueError:
+        return jsonify({"error": "Invalid seconds"}), 400
+    # Chained comparison also rejects nan
+    if not 0 < seconds <= MAX_SECONDS:
+        return jsonify({"error": f"seconds must be in (0, {MAX_SECONDS:g}]"}), 400
+
+    if not profiler.trigger(duration=seconds, mode=mode):
+        return jsonify({"status": "busy"}), 409
+
+    log_json('INFO', 'Profile started', payload={'mode': mode, 'seconds': seconds})
+    return jsonify({
+        "status": "started",
+        "mode": mode,
+        "seconds": seconds,
+        "pid": os.getpid(),
+        "output_dir": profiler.output_dir
+    }), 202
+
+@app.route('/twilio/status', methods=['POST'])
+def twilio_status():
+    """Twilio delivery status callback: validate, enqueue and return"""
+    if signature_validator is None:
+        return jsonify({"error": "Not found"}), 404
+    params = request.form.to_dict()
+    if not signature_validator.valid(public_url(), params, request.headers.get('X-Twilio-Signature')):
+        return jsonify({"error": "Forbidden"}), 403
+    if not params.get('MessageSid') or not params.get('MessageStatus'):
+        return jsonify({"error": "Missing MessageSid or MessageStatus"}), 400
+
+    # Aggregation happens in the flusher thread; a full buffer drops the update
+    status_aggregator.submit(StatusUpdate(
+        params['MessageSid'],
+        params['MessageStatus'],
+        to=params.get('To'),
+        error_code=params.get('ErrorCode'),
+        event_type=request.args.get('event_type'),
+        received_at=time.time()
+    ))
+    return '', 204
+
+@app.route('/twilio/status/stats', methods=['GET'])
+def twilio_status_stats():
+    """Delivery aggregates collected by this worker"""
+    if signature_validator is None:
+        return jsonify({"error": "Not found"}), 404
+    return jsonify({"pid": os.getpid(), **status_aggregator.snapshot()}), 200
+
 if __name__ == '__main__':
     # Verify Twilio configuration
     if not twilio_client:
@@ -0,0 +1,106 @@
+"""
+Métricas en proceso para el servicio SMS.
+
+Registro simple y thread-safe de contadores e histogramas con etiquetas.
+Los valores se exponen mediante snapshot() para logs estructurados o
+endpoints de monitoreo.
+"""
+import threading
+
+DEFAULT_BUCKETS = (1, 2, 3, 4, 5, 10)
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+class Histogram:
+    """Histograma acumulativo con buckets fijos"""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'min', 'max')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self):
+        buckets = {str(b): c for b, c in zip(self.buckets, self.counts)}
+        buckets['+Inf'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'buckets': buckets
+        }
+
+
+class Metrics:
+    """Registro de métricas del proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def snapshot(self):
+        """Copia serializable de todas las métricas"""
+        with self._lock:
+            return {
+                'counters': [
+                    {'name': n, 'labels': dict(l), 'value': v}
+                    for (n, l), v in self._counters.items()
+                ],
+                'gauges': [
+                    {'name': n, 'labels': dict(l), 'value': v}
+                    for (n, l), v in self._gauges.items()
+                ],
+                'histograms': [
+                    {'name': n, 'labels': dict(l), **h.to_dict()}
+                    for (n, l), h in self._histograms.items()
+                ]
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+# Registro global del proceso
+metrics = Metrics()
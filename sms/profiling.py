@@ -0,0 +1,224 @@
+"""
+Perfilado bajo demanda para los procesos del servicio SMS.
+
+Un disparador (señal SIGUSR1 en consumer.py, POST /debug/profile en
+message.py) captura durante un tiempo limitado:
+
+- un perfil por muestreo de pilas de todos los hilos (formato "collapsed",
+  apto para flamegraph) o un perfil cProfile del hilo principal, y
+- la diferencia entre dos snapshots de tracemalloc.
+
+Sin captura activa no hay hooks instalados: el coste es nulo. El trabajo
+pesado (muestreo, escritura de archivos) corre en un hilo aparte para no
+bloquear el I/O loop de pika.
+"""
+import collections
+import cProfile
+import io
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+
+MODES = ('sample', 'cprofile')
+MAX_SECONDS = 300.0
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class Profiler:
+    """Captura perfiles de duración limitada bajo demanda"""
+
+    def __init__(self, output_dir=None, duration=None, mode=None, interval=None,
+                 top=None, prefix='sms', on_complete=None):
+        self.output_dir = output_dir or os.environ.get('SMS_PROFILE_DIR', '/tmp/sms-profiles')
+        self.duration = float(duration or os.environ.get('SMS_PROFILE_SECONDS', '30'))
+        self.mode = mode or os.environ.get('SMS_PROFILE_MODE', 'sample')
+        self.interval = float(interval or os.environ.get('SMS_PROFILE_INTERVAL', '0.005'))
+        self.top = int(top or os.environ.get('SMS_PROFILE_TOP', '25'))
+        self.prefix = prefix
+        self.on_complete = on_complete
+        self._busy = threading.Lock()
+        self._cprofile = None
+        self._snapshot = None
+        self._started_tracemalloc = False
+        self._started_at = None
+
+    @property
+    def active(self):
+        return self._busy.locked()
+
+    def trigger(self, duration=None, mode=None):
+        """Iniciar una captura; devuelve False si ya hay una en curso"""
+        mode = mode or self.mode
+        if mode not in MODES:
+            raise ValueError(f'Modo de perfilado no soportado: {mode}')
+        duration = float(self.duration if duration is None else duration)
+        # La comparación encadenada también rechaza NaN
+        if not 0 < duration <= MAX_SECONDS:
+            raise ValueError(f'Duración de perfilado fuera de rango: {duration}')
+        if not self._busy.acquire(blocking=False):
+            return False
+
+        try:
+            self._started_at = time.strftime('%Y%m%dT%H%M%S')
+            self._start_tracemalloc()
+
+            # cProfile sólo perfila el hilo que lo activa: requiere el hilo
+            # principal y SIGALRM para detenerlo sin intervenir en el loop de pika
+            if (mode == 'cprofile'
+                    and threading.current_thread() is threading.main_thread()
+                    and hasattr(signal, 'setitimer')):
+                self._cprofile = cProfile.Profile()
+                signal.signal(signal.SIGALRM, self._stop_cprofile)
+                signal.setitimer(signal.ITIMER_REAL, duration)
+                self._cprofile.enable()
+            else:
+                threading.Thread(
+                    target=self._run_sampling,
+                    args=(duration,),
+                    name='sms-profiler',
+                    daemon=True
+                ).start()
+        except BaseException:
+            self._abort()
+            raise
+        return True
+
+    def _abort(self):
+        """Deshacer una captura que no llegó a arrancar y liberar el cerrojo"""
+        try:
+            if self._cprofile is not None:
+                self._cprofile.disable()
+                self._cprofile = None
+                signal.setitimer(signal.ITIMER_REAL, 0)
+            self._snapshot = None
+            if self._started_tracemalloc and tracemalloc.is_tracing():
+                tracemalloc.stop()
+        finally:
+            self._busy.release()
+
+    def install_signal_handler(self, signum=None):
+        """Registrar la señal que dispara la captura (por defecto SIGUSR1)"""
+        signum = signum or getattr(signal, 'SIGUSR1', None)
+        if signum is None:
+            return False
+        signal.signal(signum, lambda s, f: self.trigger())
+        return True
+
+    # ======================================================
+    # Muestreo de pilas
+    # ======================================================
+
+    def _run_sampling(self, duration):
+        try:
+            counts = collections.Counter()
+            me = threading.get_ident()
+            names = {}
+            deadline = time.monotonic() + duration
+            samples = 0
+            while time.monotonic() < deadline:
+                for thread in threading.enumerate():
+                    names[thread.ident] = thread.name
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frame_label(frame))
+                        frame = frame.f_back
+                    stack.append(names.get(ident, str(ident)))
+                    counts[';'.join(reversed(stack))] += 1
+                samples += 1
+                time.sleep(self.interval)
+
+            path = self._path('stacks.collapsed')
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in counts.most_common():
+                    f.write(f'{stack} {count}\n')
+            self._finish([path], samples=samples)
+        except Exception:
+            self._finish([])
+
+    # ======================================================
+    # cProfile
+    # ======================================================
+
+    def _stop_cprofile(self, signum, frame):
+        profile, self._cprofile = self._cprofile, None
+        if profile is None:
+            return
+        profile.disable()
+        # Escribir resultados fuera del manejador de señal
+        threading.Thread(
+            target=self._write_cprofile,
+            args=(profile,),
+            name='sms-profiler',
+            daemon=True
+        ).start()
+
+    def _write_cprofile(self, profile):
+        try:
+            raw_path = self._path('cprofile.pstats')
+            profile.dump_stats(raw_path)
+            out = io.StringIO()
+            pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(self.top)
+            text_path = self._path('cprofile.txt')
+            with open(text_path, 'w', encoding='utf-8') as f:
+                f.write(out.getvalue())
+            self._finish([raw_path, text_path])
+        except Exception:
+            self._finish([])
+
+    # ======================================================
+    # tracemalloc
+    # ======================================================
+
+    def _start_tracemalloc(self):
+        self._started_tracemalloc = not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start(10)
+        self._snapshot = tracemalloc.take_snapshot()
+
+    def _write_tracemalloc(self):
+        before, self._snapshot = self._snapshot, None
+        if before is None or not tracemalloc.is_tracing():
+            return None
+        after = tracemalloc.take_snapshot()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        path = self._path('tracemalloc.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            for stat in after.compare_to(before, 'lineno')[:self.top]:
+                f.write(f'{stat}\n')
+        return path
+
+    # ======================================================
+    # Utilidades
+    # ======================================================
+
+    def _path(self, suffix):
+        os.makedirs(self.output_dir, exist_ok=True)
+        return os.path.join(
+            self.output_dir,
+            f'{self.prefix}-{os.getpid()}-{self._started_at}-{suffix}'
+        )
+
+    def _finish(self, paths, **info):
+        try:
+            memory_path = self._write_tracemalloc()
+            if memory_path:
+                paths.append(memory_path)
+        finally:
+            self._busy.release()
+        if self.on_complete:
+            try:
+                self.on_complete(paths, info)
+            except Exception:
+                pass
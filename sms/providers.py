@@ -0,0 +1,404 @@
+"""
+Proveedores SMS intercambiables y enrutamiento por latencia y salud.
+
+Cada proveedor (Twilio, simulado, pasarela HTTP local) expone send(to, body)
+y devuelve un identificador del mensaje; Twilio además pide callbacks de
+estado a SMS_STATUS_CALLBACK_URL con el tipo de evento. El router mantiene
+por proveedor una latencia media exponencial, la tasa de error de los últimos
+envíos y un circuito que lo aparta tras fallos consecutivos; cada mensaje va
+al proveedor con mejor puntuación que tenga cupo de concurrencia, y ante un
+error reintentable se pasa al siguiente (failover). Un proveedor sin muestras
+puntúa con una latencia pesimista y cada SMS_PROVIDER_PROBE_INTERVAL segundos
+un proveedor sano sin tráfico recibe un envío de sondeo, así uno que perdió
+una vez puede recuperarse. El simulado sólo se usa si no hay ningún proveedor
+real configurado: nunca absorbe SMS reales. Las decisiones se exportan como
+métricas sms_provider_*.
+"""
+import collections
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from twilio.base.exceptions import TwilioException, TwilioRestException
+
+from delivery import callback_url
+from metrics import metrics
+from tracing import tracer
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class ProviderError(Exception):
+    """Fallo de envío; retryable indica si tiene sentido probar otro proveedor"""
+
+    def __init__(self, message, provider=None, retryable=True):
+        super().__init__(message)
+        self.provider = provider
+        self.retryable = retryable
+
+
+class NoProviderAvailable(ProviderError):
+    """Ningún proveedor con cupo dentro del tiempo de espera"""
+
+    def __init__(self, message):
+        super().__init__(message, provider=None, retryable=False)
+
+
+class SendResult:
+    """Resultado de un envío exitoso"""
+
+    __slots__ = ('provider', 'sid', 'latency', 'attempts')
+
+    def __init__(self, provider, sid, latency, attempts):
+        self.provider = provider
+        self.sid = sid
+        self.latency = latency
+        self.attempts = attempts
+
+
+# ======================================
+# Proveedores
+# ======================================
+
+class SmsProvider:
+    """Interfaz de proveedor"""
+
+    name = 'provider'
+    # Los simulados no entregan nada: sólo si no hay proveedores reales
+    simulated = False
+
+    def __init__(self, max_concurrency=10):
+        self.max_concurrency = max_concurrency
+
+    def available(self):
+        """False si el proveedor no está configurado (no es un fallo de salud)"""
+        return True
+
+    def send(self, to, body):
+        raise NotImplementedError
+
+    def dispatch(self, to, body, event_type=None):
+        """Envío desde el router; el tipo de evento sólo lo usa quien reporta estados"""
+        return self.send(to, body)
+
+
+class TwilioProvider(SmsProvider):
+    """Twilio; el cliente se resuelve en cada envío para admitir reconfiguración"""
+
+    name = 'twilio'
+
+    def __init__(self, client_getter, from_number, max_concurrency=10, status_callback=None):
+        super().__init__(max_concurrency)
+        self.client_getter = client_getter
+        self.from_number = from_number
+        self.status_callback = status_callback
+
+    def available(self):
+        return self.client_getter() is not None
+
+    def send(self, to, body, event_type=None):
+        extra = {}
+        if self.status_callback:
+            extra['status_callback'] = callback_url(self.status_callback, event_type)
+        try:
+            response = self.client_getter().messages.create(body=body, from_=self.from_number, to=to, **extra)
+        except TwilioRestException as e:
+            # 4xx (número inválido, bloqueado...) fallaría igual en otro proveedor
+            status = getattr(e, 'status', None) or 500
+            raise ProviderError(str(e), self.name, retryable=status >= 500 or status == 429) from e
+        except TwilioException as e:
+            raise ProviderError(str(e), self.name) from e
+        return getattr(response, 'sid', None)
+
+    dispatch = send
+
+
+class SimulatedProvider(SmsProvider):
+    """No envía nada; latencia y tasa de error configurables para pruebas de carga"""
+
+    name = 'simulated'
+    simulated = True
+
+    def __init__(self, latency=0.0, error_rate=0.0, max_concurrency=100, rng=None):
+        super().__init__(max_concurrency)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = rng or random.Random()
+        self._seq = itertools.count(1)
+
+    def send(self, to, body):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            raise ProviderError('Fallo simulado', self.name)
+        return f'SIM{next(self._seq):010d}'
+
+
+class HttpProvider(SmsProvider):
+    """Pasarela HTTP: POST JSON {to, body, from} y respuesta {sid} o {id}"""
+
+    name = 'http'
+
+    def __init__(self, url, from_number=None, timeout=5.0, token=None, max_concurrency=10):
+        super().__init__(max_concurrency)
+        self.url = url
+        self.from_number = from_number
+        self.timeout = timeout
+        self.token = token
+
+    def available(self):
+        return bool(self.url)
+
+    def send(self, to, body):
+        payload = json.dumps({'to': to, 'body': body, 'from': self.from_number}).encode('utf-8')
+        request = urllib.request.Request(self.url, data=payload, method='POST')
+        request.add_header('Content-Type', 'application/json')
+        if self.token:
+            request.add_header('Authorization', f'Bearer {self.token}')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                raw = response.read()
+        except urllib.error.HTTPError as e:
+            raise ProviderError(f'HTTP {e.code}', self.name, retryable=e.code >= 500 or e.code == 429) from e
+        except (urllib.error.URLError, OSError) as e:
+            raise ProviderError(str(getattr(e, 'reason', e)), self.name) from e
+        try:
+            data = json.loads(raw) if raw else {}
+        except ValueError:
+            data = {}
+        if not isinstance(data, dict):
+            return None
+        return data.get('sid') or data.get('id')
+
+
+# ======================================
+# Router
+# ======================================
+
+class ProviderStats:
+    """Latencia, errores recientes, circuito y cupo de un proveedor"""
+
+    def __init__(self, provider, window=50, alpha=0.2, initial_latency=1.0, last_used=0.0):
+        self.provider = provider
+        self.alpha = alpha
+        self.initial_latency = initial_latency
+        self.latency = None
+        self.last_used = last_used
+        self.outcomes = collections.deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.inflight = 0
+        self.slots = threading.BoundedSemaphore(provider.max_concurrency)
+
+    @property
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def record(self, ok, latency):
+        if latency is not None:
+            self.latency = latency if self.latency is None else self.latency + self.alpha * (latency - self.latency)
+        self.outcomes.append(ok)
+        self.consecutive_failures = 0 if ok else self.consecutive_failures + 1
+
+    def score(self):
+        """Menor es mejor: latencia penalizada por errores y ocupación"""
+        # Sin muestras, pesimista: no gana hasta demostrarlo con un sondeo
+        latency = self.initial_latency if self.latency is None else self.latency
+        load = self.inflight / self.provider.max_concurrency
+        return latency * (1.0 + 4.0 * self.error_rate) * (1.0 + load)
+
+
+class ProviderRouter:
+    """Elige proveedor por puntuación, respeta concurrencia y hace failover"""
+
+    def __init__(self, providers, failure_threshold=3, cooldown=30.0, acquire_timeout=5.0,
+                 window=50, initial_latency=1.0, probe_interval=30.0, clock=time.monotonic):
+        self.providers = list(providers)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.acquire_timeout = acquire_timeout
+        self.probe_interval = probe_interval
+        self.clock = clock
+        now = clock()
+        self.stats = {p.name: ProviderStats(p, window, initial_latency=initial_latency, last_used=now)
+                      for p in self.providers}
+        self._lock = threading.Lock()
+
+    def active(self):
+        """Proveedores configurados (p. ej. Twilio sin credenciales queda fuera);
+        los simulados sólo si no queda ninguno real"""
+        configured = [p for p in self.providers if p.available()]
+        real = [p for p in configured if not p.simulated]
+        return real or configured
+
+    def healthy(self, name):
+        return self.clock() >= self.stats[name].open_until
+
+    def ranked(self, providers=None):
+        """Sanos primero, luego con circuito abierto; por puntuación y orden configurado"""
+        providers = self.active() if providers is None else providers
+        with self._lock:
+            order = sorted(
+                enumerate(providers),
+                key=lambda item: (not self.healthy(item[1].name), self.stats[item[1].name].score(), item[0])
+            )
+        return [p for _, p in order]
+
+    def _probe(self, candidates):
+        """Adelantar un proveedor sano no preferido que lleva probe_interval sin tráfico"""
+        if not self.probe_interval or len(candidates) < 2:
+            return candidates
+        now = self.clock()
+        with self._lock:
+            for index, provider in enumerate(candidates[1:], 1):
+                stats = self.stats[provider.name]
+                if self.healthy(provider.name) and now - stats.last_used >= self.probe_interval:
+                    # Reservar el sondeo: los envíos concurrentes no sondean a la vez
+                    stats.last_used = now
+                    break
+            else:
+                return candidates
+        metrics.inc('sms_provider_probes', provider=provider.name)
+        return [provider] + candidates[:index] + candidates[index + 1:]
+
+    def _acquire(self, candidates):
+        """Primer candidato con cupo; si todos están llenos, esperar al mejor"""
+        for provider in candidates:
+            if self.stats[provider.name].slots.acquire(blocking=False):
+                return provider
+            metrics.inc('sms_provider_saturated', provider=provider.name)
+        best = candidates[0]
+        if self.stats[best.name].slots.acquire(timeout=self.acquire_timeout):
+            return best
+        return None
+
+    def _record(self, provider, ok, latency):
+        stats = self.stats[provider.name]
+        with self._lock:
+            stats.record(ok, latency)
+            if not ok and stats.consecutive_failures >= self.failure_threshold:
+                if self.healthy(provider.name):
+                    metrics.inc('sms_provider_circuit_opened', provider=provider.name)
+                stats.open_until = self.clock() + self.cooldown
+            metrics.set('sms_provider_circuit_open', 0 if self.healthy(provider.name) else 1, provider=provider.name)
+            metrics.set('sms_provider_error_rate', round(stats.error_rate, 4), provider=provider.name)
+            if stats.latency is not None:
+                metrics.set('sms_provider_latency_ewma_seconds', round(stats.latency, 6), provider=provider.name)
+
+    def send(self, to, body, event_type=None):
+        """Enviar por el mejor proveedor; ProviderError si ninguno lo consigue"""
+        candidates = self.ranked()
+        if not candidates:
+            raise NoProviderAvailable('No hay proveedores SMS configurados')
+        candidates = self._probe(candidates)
+
+        last_error = None
+        attempts = 0
+        previous = None
+        while candidates:
+            provider = self._acquire(candidates)
+            if provider is None:
+                metrics.inc('sms_provider_exhausted')
+                raise last_error or NoProviderAvailable('Proveedores SMS sin cupo')
+            candidates.remove(provider)
+            stats = self.stats[provider.name]
+            attempts += 1
+            if previous is not None:
+                metrics.inc('sms_provider_failover', source=previous, target=provider.name)
+            metrics.inc('sms_provider_selected', provider=provider.name, event_type=event_type or 'unknown')
+
+            with self._lock:
+                stats.inflight += 1
+                stats.last_used = self.clock()
+            metrics.set('sms_provider_inflight', stats.inflight, provider=provider.name)
+            start = time.perf_counter()
+            try:
+                with tracer.span(f'{provider.name}.send', event_type=event_type, attempt=attempts) as span:
+                    sid = provider.dispatch(to, body, event_type)
+                    span.set_attribute('sid', sid)
+            except Exception as e:
+                latency = time.perf_counter() - start
+                error = e if isinstance(e, ProviderError) else ProviderError(str(e), provider.name)
+                if error.provider is None:
+                    error.provider = provider.name
+                # Los rechazos del destinatario no dicen nada de la salud del proveedor
+                self._record(provider, not error.retryable, latency if error.retryable else None)
+                metrics.inc('sms_provider_errors', provider=provider.name, retryable=str(error.retryable).lower())
+                if error is not e:
+                    error.__cause__ = e
+                last_error = error
+                if not error.retryable:
+                    raise error
+                previous = provider.name
+                continue
+            finally:
+                with self._lock:
+                    stats.inflight -= 1
+                stats.slots.release()
+                metrics.set('sms_provider_inflight', stats.inflight, provider=provider.name)
+
+            latency = time.perf_counter() - start
+            self._record(provider, True, latency)
+            metrics.observe('sms_provider_latency_seconds', latency, buckets=LATENCY_BUCKETS, provider=provider.name)
+            return SendResult(provider.name, sid, latency, attempts)
+
+        raise last_error
+
+
+# ======================================
+# Configuración desde entorno
+# ======================================
+
+def parse_limits(raw):
+    """Parsear 'proveedor=n,...'"""
+    limits = {}
+    for item in (raw or '').split(','):
+        name, sep, value = item.partition('=')
+        if sep:
+            limits[name.strip()] = int(value)
+    return limits
+
+
+def router_from_env(twilio_client_getter, from_number):
+    """Crear el router según SMS_PROVIDERS (orden = preferencia ante empate;
+    simulated sólo actúa si ningún proveedor real está configurado)"""
+    limits = parse_limits(os.environ.get('SMS_PROVIDER_CONCURRENCY', 'twilio=10,http=10,simulated=100'))
+    factories = {
+        'twilio': lambda: TwilioProvider(
+            twilio_client_getter,
+            from_number,
+            limits.get('twilio', 10),
+            status_callback=os.environ.get('SMS_STATUS_CALLBACK_URL') or None
+        ),
+        'http': lambda: HttpProvider(
+            os.environ.get('SMS_HTTP_PROVIDER_URL'),
+            from_number=from_number,
+            timeout=float(os.environ.get('SMS_HTTP_PROVIDER_TIMEOUT', '5')),
+            token=os.environ.get('SMS_HTTP_PROVIDER_TOKEN'),
+            max_concurrency=limits.get('http', 10)
+        ),
+        'simulated': lambda: SimulatedProvider(
+            latency=float(os.environ.get('SMS_SIMULATED_LATENCY', '0')),
+            error_rate=float(os.environ.get('SMS_SIMULATED_ERROR_RATE', '0')),
+            max_concurrency=limits.get('simulated', 100)
+        ),
+    }
+    names = [n.strip() for n in os.environ.get('SMS_PROVIDERS', 'twilio').split(',') if n.strip()]
+    unknown = [n for n in names if n not in factories]
+    if unknown:
+        raise ValueError(f'Proveedores SMS desconocidos: {", ".join(unknown)}')
+    return ProviderRouter(
+        [factories[n]() for n in names],
+        failure_threshold=int(os.environ.get('SMS_PROVIDER_FAILURE_THRESHOLD', '3')),
+        cooldown=float(os.environ.get('SMS_PROVIDER_COOLDOWN', '30')),
+        acquire_timeout=float(os.environ.get('SMS_PROVIDER_ACQUIRE_TIMEOUT', '5')),
+        initial_latency=float(os.environ.get('SMS_PROVIDER_INITIAL_LATENCY', '1')),
+        probe_interval=float(os.environ.get('SMS_PROVIDER_PROBE_INTERVAL', '30'))
+    )
@@ -0,0 +1,249 @@
+"""
+Protección contra ráfagas por destinatario y tipo de evento.
+
+Usa un contador de ventana deslizante aproximada (ventana actual + anterior
+ponderada): O(1) en tiempo y memoria por clave. El almacén en proceso está
+acotado con expulsión LRU; opcionalmente se comparte entre procesos con
+Redis (SMS_RATE_LIMIT_REDIS_URL), con caída al almacén local si falla.
+
+Cada tipo de evento define límite, ventana y acción al excederlo:
+- drop: descartar el mensaje
+- digest: descartar y enviar un único resumen al cerrar la ventana
+- delay: reprogramar el envío en huecos espaciados ventana/límite a partir
+  del fin de la ventana; el intento retrasado no cuenta hasta que se reintenta
+  y vuelve a pasar por el limitador
+"""
+import collections
+import os
+import threading
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - dependencia opcional
+    redis = None
+
+ALLOW = 'allow'
+DROP = 'drop'
+DIGEST = 'digest'
+DELAY = 'delay'
+ACTIONS = (DROP, DIGEST, DELAY)
+
+DIGEST_TEMPLATES = {
+    'security.login': 'Alerta: {count} accesos adicionales a tu cuenta en los últimos {minutes} min. Si no fuiste tú, cambia tu contraseña.',
+    'security.password_change': 'Alerta: {count} cambios de contraseña adicionales en los últimos {minutes} min.',
+}
+DEFAULT_POLICIES = 'security.login=3/600:digest,security.password_change=3/600:digest,account.created=2/3600:drop'
+
+DEFAULT_DIGEST_TEMPLATE = 'Se omitieron {count} notificaciones adicionales en los últimos {minutes} min.'
+
+
+class Policy:
+    """Límite por ventana para un tipo de evento"""
+
+    __slots__ = ('limit', 'window', 'action')
+
+    def __init__(self, limit, window, action=DROP):
+        if action not in ACTIONS:
+            raise ValueError(f'Acción de rate limit no soportada: {action}')
+        self.limit = limit
+        self.window = window
+        self.action = action
+
+
+class Decision:
+    """Resultado de evaluar un mensaje contra su política"""
+
+    __slots__ = ('action', 'count', 'retry_at', 'first_suppressed')
+
+    def __init__(self, action, count=0, retry_at=None, first_suppressed=False):
+        self.action = action
+        self.count = count
+        self.retry_at = retry_at
+        self.first_suppressed = first_suppressed
+
+    @property
+    def allowed(self):
+        return self.action == ALLOW
+
+
+def parse_policies(raw):
+    """Parsear 'tipo=limite/ventana_s:accion,...' ('*' aplica al resto)"""
+    policies = {}
+    for item in (raw or '').split(','):
+        item = item.strip()
+        if not item or '=' not in item:
+            continue
+        event_type, _, spec = item.partition('=')
+        rate, _, action = spec.partition(':')
+        limit, _, window = rate.partition('/')
+        policies[event_type.strip()] = Policy(int(limit), float(window), action.strip() or DROP)
+    return policies
+
+
+def _estimate(idx, curr, prev, now, window):
+    """Conteo estimado en la ventana deslizante que termina en now"""
+    elapsed = (now - idx * window) / window
+    return prev * (1.0 - elapsed) + curr
+
+
+class MemoryRateStore:
+    """Contadores por clave en proceso, acotados con expulsión LRU"""
+
+    def __init__(self, max_keys=200000):
+        self.max_keys = max_keys
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def hit(self, key, now, window):
+        """Registrar un intento; devuelve (conteo estimado, fin de ventana)"""
+        idx = int(now // window)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                curr, prev = 1, 0
+            else:
+                last_idx, last_curr, last_prev = entry
+                if idx == last_idx:
+                    curr, prev = last_curr + 1, last_prev
+                elif idx == last_idx + 1:
+                    curr, prev = 1, last_curr
+                else:
+                    curr, prev = 1, 0
+                self._entries.move_to_end(key)
+            # Tuplas de enteros: ~64 bytes por clave además de la propia clave
+            self._entries[key] = (idx, curr, prev)
+            if len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return _estimate(idx, curr, prev, now, window), (idx + 1) * window
+
+    def undo(self, key, now, window):
+        """Retirar un intento registrado en la ventana actual"""
+        idx = int(now // window)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == idx and entry[1] > 0:
+                self._entries[key] = (idx, entry[1] - 1, entry[2])
+
+
+class RedisRateStore:
+    """Contadores compartidos entre procesos del consumer"""
+
+    def __init__(self, client, prefix='sms:rl:'):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url):
+        if redis is None:
+            raise RuntimeError('El paquete redis no está instalado')
+        return cls(redis.Redis.from_url(url, socket_timeout=0.2))
+
+    def hit(self, key, now, window):
+        idx = int(now // window)
+        curr_key = f'{self.prefix}{key}:{idx}'
+        prev_key = f'{self.prefix}{key}:{idx - 1}'
+        pipe = self.client.pipeline()
+        pipe.incr(curr_key)
+        pipe.expire(curr_key, int(window * 2) + 1)
+        pipe.get(prev_key)
+        curr, _, prev = pipe.execute()
+        return _estimate(idx, int(curr), int(prev or 0), now, window), (idx + 1) * window
+
+    def undo(self, key, now, window):
+        self.client.decr(f'{self.prefix}{key}:{int(now // window)}')
+
+
+class RateLimiter:
+    """Evalúa cada mensaje contra la política de su tipo de evento"""
+
+    def __init__(self, policies, store=None, fallback=None, max_digests=100000, max_delayed=100000):
+        self.policies = policies
+        self.fallback = fallback or MemoryRateStore()
+        self.store = store or self.fallback
+        self.store_errors = 0
+        self.max_digests = max_digests
+        self.max_delayed = max_delayed
+        self._digests = collections.OrderedDict()
+        self._digest_lock = threading.Lock()
+        # clave -> último hueco asignado a un envío retrasado
+        self._slots = collections.OrderedDict()
+        self._slot_lock = threading.Lock()
+
+    def policy_for(self, event_type):
+        return self.policies.get(event_type) or self.policies.get('*')
+
+    def check(self, event_type, recipient, now):
+        policy = self.policy_for(event_type)
+        if policy is None:
+            return Decision(ALLOW)
+
+        key = f'{event_type}|{recipient}'
+        try:
+            store = self.store
+            count, window_end = store.hit(key, now, policy.window)
+        except Exception:
+            # Si el almacén compartido falla, limitar al menos por proceso
+            self.store_errors += 1
+            store = self.fallback
+            count, window_end = store.hit(key, now, policy.window)
+
+        if count <= policy.limit:
+            return Decision(ALLOW, count)
+
+        if policy.action == DELAY:
+            # No se envía ahora: contará cuando se reintente
+            try:
+                store.undo(key, now, policy.window)
+            except Exception:
+                self.store_errors += 1
+            return Decision(DELAY, count, self._next_slot(key, now, window_end, policy))
+
+        first = False
+        if policy.action == DIGEST:
+            with self._digest_lock:
+                first = key not in self._digests
+                self._digests[key] = self._digests.get(key, 0) + 1
+                if len(self._digests) > self.max_digests:
+                    self._digests.popitem(last=False)
+        return Decision(policy.action, count, window_end, first)
+
+    def _next_slot(self, key, now, window_end, policy):
+        """Hueco para un envío retrasado: uno cada ventana/límite tras los ya asignados"""
+        spacing = policy.window / max(policy.limit, 1)
+        with self._slot_lock:
+            last = self._slots.pop(key, 0)
+            slot = max(window_end, last, now) + spacing
+            self._slots[key] = slot
+            if len(self._slots) > self.max_delayed:
+                self._slots.popitem(last=False)
+        return slot
+
+    def take_digest(self, event_type, recipient):
+        """Extraer el número de mensajes suprimidos pendientes de resumen"""
+        with self._digest_lock:
+            return self._digests.pop(f'{event_type}|{recipient}', 0)
+
+    def digest_message(self, event_type, count):
+        policy = self.policy_for(event_type)
+        minutes = max(1, int(round(policy.window / 60))) if policy else 0
+        template = DIGEST_TEMPLATES.get(event_type, DEFAULT_DIGEST_TEMPLATE)
+        return template.format(count=count, minutes=minutes)
+
+
+def limiter_from_env(shared=True):
+    """Crear el limitador según SMS_RATE_LIMITS y SMS_RATE_LIMIT_*"""
+    fallback = MemoryRateStore(int(os.environ.get('SMS_RATE_LIMIT_MAX_KEYS', '200000')))
+    store = None
+    redis_url = os.environ.get('SMS_RATE_LIMIT_REDIS_URL')
+    if shared and redis_url:
+        store = RedisRateStore.from_url(redis_url)
+    return RateLimiter(
+        parse_policies(os.environ.get('SMS_RATE_LIMITS', DEFAULT_POLICIES)),
+        store=store,
+        fallback=fallback
+    )
@@ -0,0 +1,196 @@
+"""
+Entrega programada (send_at / not_before) y horario de silencio.
+
+- Retrasos cortos (<= SMS_SCHEDULER_MAX_HOLD) se retienen en un heap de
+  temporizadores en proceso. El mensaje AMQP queda sin ack hasta enviarse,
+  por lo que un reinicio lo devuelve a la cola sin pérdida.
+- Retrasos largos se estacionan en colas de espera por bucket (TTL fijo +
+  dead-letter de vuelta a la cola principal); al volver se recalcula el tiempo
+  restante y se baja de bucket hasta poder retenerlo en proceso.
+"""
+import heapq
+import itertools
+import os
+import threading
+from datetime import datetime, timedelta
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # pragma: no cover - Python < 3.9
+    ZoneInfo = None
+
+SCHEDULED_ROUTING_KEY_HEADER = 'x-sms-routing-key'
+
+
+class TimerQueue:
+    """Heap de temporizadores: alta y extracción O(log n), thread-safe"""
+
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, due, action):
+        """Programar action() para el instante due (epoch)"""
+        # El contador desempata vencimientos iguales en orden FIFO
+        with self._lock:
+            heapq.heappush(self._heap, (due, next(self._seq), action))
+
+    def next_deadline(self):
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """Extraer las acciones vencidas en orden de vencimiento"""
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap)[2])
+        return due
+
+
+class HeldPrefetch:
+    """basic_qos = prefetch configurado + entregas retenidas sin ack ahora mismo.
+
+    Los mensajes retenidos ocupan prefetch hasta enviarse; sin ajustar la QoS
+    bloquearían el consumo, y reservar de antemano SMS_SCHEDULER_MAX_HELD
+    dejaría cientos de entregas sin ack aunque no haya nada retenido. El
+    ajuste se ejecuta en el hilo de la conexión (add_callback_threadsafe).
+    """
+
+    def __init__(self, connection, channel, base):
+        self.connection = connection
+        self.channel = channel
+        self.base = base
+        self.held = 0
+        self._applied = None
+        self._lock = threading.Lock()
+
+    def hold(self):
+        with self._lock:
+            self.held += 1
+        self._request()
+
+    def release(self):
+        with self._lock:
+            self.held = max(0, self.held - 1)
+        self._request()
+
+    def set_base(self, base):
+        self.base = base
+        self._request()
+
+    def _request(self):
+        self.connection.add_callback_threadsafe(self.apply)
+
+    def apply(self):
+        """Reenviar basic_qos si el objetivo cambió (hilo de la conexión)"""
+        target = self.base + self.held
+        if target != self._applied:
+            self.channel.basic_qos(prefetch_count=target)
+            self._applied = target
+        return target
+
+
+class QuietHours:
+    """Ventana diaria en hora local en la que no se envían mensajes no urgentes"""
+
+    def __init__(self, start, end, tz='UTC'):
+        self.start = start
+        self.end = end
+        self.tz = ZoneInfo(tz) if ZoneInfo else None
+
+    @classmethod
+    def parse(cls, raw, tz='UTC'):
+        """Parsear 'HH:MM-HH:MM'; devuelve None si está vacío"""
+        if not raw:
+            return None
+        start, _, end = raw.partition('-')
+        return cls(_parse_clock(start), _parse_clock(end), tz)
+
+    def _contains(self, minutes):
+        if self.start <= self.end:
+            return self.start <= minutes < self.end
+        # Ventana que cruza medianoche (p. ej. 22:00-07:00)
+        return minutes >= self.start or minutes < self.end
+
+    def next_allowed(self, ts):
+        """Primer instante >= ts fuera de la ventana de silencio"""
+        local = datetime.fromtimestamp(ts, self.tz)
+        minutes = local.hour * 60 + local.minute
+        if not self._contains(minutes):
+            return ts
+        end = local.replace(hour=self.end // 60, minute=self.end % 60, second=0, microsecond=0)
+        if end <= local:
+            end += timedelta(days=1)
+        return end.timestamp()
+
+
+def _parse_clock(value):
+    hours, _, minutes = value.strip().partition(':')
+    hours, minutes = int(hours), int(minutes or 0)
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f'Hora inválida: {value}')
+    return hours * 60 + minutes
+
+
+def parse_buckets(raw):
+    """Parsear la lista de buckets de espera en segundos, ordenada"""
+    return sorted({int(v) for v in (raw or '').split(',') if v.strip()})
+
+
+def pick_bucket(remaining, buckets):
+    """Mayor bucket que no se pasa del tiempo restante (o el menor)"""
+    chosen = buckets[0]
+    for bucket in buckets:
+        if bucket > remaining:
+            break
+        chosen = bucket
+    return chosen
+
+
+def delay_queue_name(queue, bucket):
+    return f'{queue}.delay.{bucket}s'
+
+
+def declare_delay_queues(channel, queue, buckets):
+    """Declarar las colas de espera: TTL por bucket y dead-letter a la cola principal"""
+    for bucket in buckets:
+        channel.queue_declare(
+            queue=delay_queue_name(queue, bucket),
+            durable=True,
+            arguments={
+                'x-message-ttl': bucket * 1000,
+                # Exchange por defecto: vuelve sólo a nuestra cola, no a otros bindings
+                'x-dead-letter-exchange': '',
+                'x-dead-letter-routing-key': queue
+            }
+        )
+
+
+# Configuración desde entorno
+MAX_HOLD = float(os.environ.get('SMS_SCHEDULER_MAX_HOLD', '300'))
+MAX_HELD = int(os.environ.get('SMS_SCHEDULER_MAX_HELD', '500'))
+DELAY_BUCKETS = parse_buckets(os.environ.get('SMS_DELAY_BUCKETS', '60,300,900,3600,14400,43200'))
+QUIET_HOURS = QuietHours.parse(
+    os.environ.get('SMS_QUIET_HOURS', ''),
+    os.environ.get('SMS_QUIET_HOURS_TZ', 'America/Bogota')
+)
+QUIET_HOURS_EVENTS = frozenset(
+    t.strip() for t in os.environ.get('SMS_QUIET_HOURS_EVENTS', 'account.created,notification').split(',') if t.strip()
+)
+
+
+def delivery_time(event, now, quiet_hours=QUIET_HOURS, quiet_events=QUIET_HOURS_EVENTS):
+    """Instante de entrega del evento, o None si debe enviarse ya"""
+    send_at = getattr(event, 'send_at', None)
+    not_before = getattr(event, 'not_before', None)
+    due = max(t for t in (now, send_at, not_before) if t is not None)
+
+    if quiet_hours and event.type in quiet_events and not getattr(event, 'urgent', False):
+        due = quiet_hours.next_allowed(due)
+
+    return due if due > now else None
@@ -0,0 +1,196 @@
+"""
+Análisis de codificación y segmentos para cuerpos SMS.
+
+Un SMS en GSM-7 admite 160 caracteres (153 por segmento si es multiparte);
+cualquier carácter fuera del alfabeto GSM 03.38 obliga a UCS-2, que admite
+70 unidades UTF-16 (67 por segmento). Este módulo calcula la codificación y
+el número de segmentos, ofrece transliteración opcional a GSM-7 y recorta
+mensajes que excedan el presupuesto de segmentos de su tipo de evento.
+"""
+import os
+import unicodedata
+
+GSM7 = 'GSM-7'
+UCS2 = 'UCS-2'
+
+# Alfabeto básico GSM 03.38 (sin el escape 0x1B)
+GSM7_BASIC = frozenset(
+    '@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !"#¤%&\'()*+,-./0123456789:;<=>?'
+    '¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà'
+)
+# Tabla de extensión: cada carácter ocupa dos septetos (escape + código)
+GSM7_EXTENSION = frozenset('^{}\\[~]|€\f')
+
+LIMITS = {
+    GSM7: (160, 153),
+    UCS2: (70, 67),
+}
+
+ELLIPSIS = '...'
+
+# Sustituciones para caracteres comunes sin equivalente directo en GSM-7
+TRANSLITERATIONS = {
+    '‘': "'", '’': "'", '‚': "'", '‛': "'",
+    '“': '"', '”': '"', '„': '"', '«': '"', '»': '"',
+    '–': '-', '—': '-', '−': '-',
+    '…': '...', '\u00a0': ' ', '\t': ' ',
+    '´': "'", '`': "'",
+}
+
+
+class SegmentInfo:
+    """Resultado del análisis de un cuerpo SMS"""
+
+    __slots__ = ('encoding', 'units', 'segments')
+
+    def __init__(self, encoding, units, segments):
+        self.encoding = encoding
+        self.units = units
+        self.segments = segments
+
+    def to_dict(self):
+        return {'encoding': self.encoding, 'units': self.units, 'segments': self.segments}
+
+    def __repr__(self):
+        return f'SegmentInfo({self.encoding!r}, units={self.units}, segments={self.segments})'
+
+
+def is_gsm7(text):
+    """Indica si el texto puede enviarse completo en GSM-7"""
+    return all(ch in GSM7_BASIC or ch in GSM7_EXTENSION for ch in text)
+
+
+def _costs(text, encoding):
+    """Unidades que ocupa cada carácter en la codificación dada"""
+    if encoding == GSM7:
+        return [2 if ch in GSM7_EXTENSION else 1 for ch in text]
+    # UCS-2 en la práctica es UTF-16: fuera del BMP ocupa un par sustituto
+    return [2 if ord(ch) > 0xFFFF else 1 for ch in text]
+
+
+def _pack(costs, per_segment):
+    """Número de segmentos sin partir escapes ni pares sustitutos"""
+    segments, used = 1, 0
+    for cost in costs:
+        if used + cost > per_segment:
+            segments += 1
+            used = 0
+        used += cost
+    return segments
+
+
+def analyze(text):
+    """Calcular codificación, unidades y segmentos de un cuerpo SMS"""
+    text = text or ''
+    encoding = GSM7 if is_gsm7(text) else UCS2
+    costs = _costs(text, encoding)
+    units = sum(costs)
+    single, multi = LIMITS[encoding]
+    segments = 1 if units <= single else _pack(costs, multi)
+    return SegmentInfo(encoding, units, segments)
+
+
+def transliterate(text):
+    """Convertir el texto a GSM-7: mapear acentos y descartar emoji/símbolos"""
+    out = []
+    for ch in text:
+        if ch in GSM7_BASIC or ch in GSM7_EXTENSION:
+            out.append(ch)
+            continue
+        if ch in TRANSLITERATIONS:
+            out.append(TRANSLITERATIONS[ch])
+            continue
+        # á -> a, Í -> I, ç -> c ... (descomposición canónica sin marcas)
+        base = ''.join(
+            c for c in unicodedata.normalize('NFKD', ch)
+            if not unicodedata.combining(c)
+        )
+        if base and all(c in GSM7_BASIC or c in GSM7_EXTENSION for c in base):
+            out.append(base)
+        # Emoji, selectores de variante y demás símbolos se descartan
+    # Evitar espacios dobles o iniciales al eliminar emoji
+    lines = ''.join(out).split('\n')
+    return '\n'.join(' '.join(part for part in line.split(' ') if part) for line in lines)
+
+
+def truncate(text, max_segments):
+    """Recortar el texto por palabra para que quepa en max_segments"""
+    if max_segments is None or max_segments < 1:
+        return text
+    info = analyze(text)
+    if info.segments <= max_segments:
+        return text
+
+    encoding = info.encoding
+    single, multi = LIMITS[encoding]
+    capacity = single if max_segments == 1 else multi * max_segments
+    capacity -= len(ELLIPSIS)
+
+    costs = _costs(text, encoding)
+    used, cut = 0, 0
+    for i, cost in enumerate(costs):
+        if used + cost > capacity:
+            break
+        used += cost
+        cut = i + 1
+
+    head = text[:cut]
+    # Preferir cortar en un límite de palabra si no se pierde demasiado
+    boundary = max(head.rfind(' '), head.rfind('\n'))
+    if boundary >= cut * 0.75:
+        head = head[:boundary]
+    head = head.rstrip()
+
+    candidate = head + ELLIPSIS
+    # El empaquetado multiparte puede desplazar escapes; ajustar si hace falta
+    while head and analyze(candidate).segments > max_segments:
+        head = head[:-1].rstrip()
+        candidate = head + ELLIPSIS
+    return candidate
+
+
+def parse_budgets(raw):
+    """Parsear 'tipo=segmentos,tipo2=segmentos' a un diccionario"""
+    budgets = {}
+    for item in (raw or '').split(','):
+        if '=' not in item:
+            continue
+        event_type, _, value = item.partition('=')
+        try:
+            budgets[event_type.strip()] = int(value)
+        except ValueError:
+            continue
+    return budgets
+
+
+# Configuración desde entorno
+TRANSLITERATE = os.environ.get('SMS_TRANSLITERATE', 'false').lower() in ('1', 'true', 'yes')
+DEFAULT_SEGMENT_BUDGETS = 'service.alert=2,security.login=1,account.created=1,security.password_change=1'
+SEGMENT_BUDGETS = parse_budgets(os.environ.get('SMS_SEGMENT_BUDGETS', DEFAULT_SEGMENT_BUDGETS))
+DEFAULT_SEGMENT_BUDGET = int(os.environ.get('SMS_DEFAULT_SEGMENT_BUDGET', '10'))
+
+
+def optimize(text, event_type=None, transliterate_text=None, budgets=None):
+    """Aplicar transliteración y presupuesto de segmentos a un cuerpo SMS.
+
+    Devuelve (texto, SegmentInfo, truncado).
+    """
+    if transliterate_text is None:
+        transliterate_text = TRANSLITERATE
+    if budgets is None:
+        budgets = SEGMENT_BUDGETS
+
+    if transliterate_text:
+        text = transliterate(text)
+
+    budget = budgets.get(event_type, DEFAULT_SEGMENT_BUDGET)
+    truncated = False
+    if budget and analyze(text).segments > budget:
+        # Antes de perder contenido, intentar que quepa pasando a GSM-7
+        if not transliterate_text:
+            text = transliterate(text)
+        if analyze(text).segments > budget:
+            text = truncate(text, budget)
+            truncated = True
+
+    return text, analyze(text), truncated
@@ -0,0 +1,135 @@
+"""
+Ejecución paralela que preserva el orden por destinatario.
+
+Cada destinatario se asigna con jump consistent hash a uno de N carriles
+seriales (un hilo y una cola acotada por carril): los mensajes de un mismo
+destinatario se procesan en orden y los de destinatarios distintos en
+paralelo. Se miden profundidad por carril y el bloqueo por cabeza de cola
+(head-of-line) que sufre cada tarea detrás de otras del mismo carril.
+
+Los canales de pika no son thread-safe: ThreadsafeChannel reenvía ack,
+nack y publish al hilo de la conexión con add_callback_threadsafe.
+"""
+import functools
+import hashlib
+import queue
+import threading
+import time
+
+from metrics import metrics
+
+_STOP = object()
+
+
+def jump_hash(key, buckets):
+    """Jump consistent hash (Lamping & Veach): mueve ~1/n claves al cambiar n"""
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def lane_for(key, lanes):
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return jump_hash(int.from_bytes(digest, 'big'), lanes)
+
+
+class ShardedExecutor:
+    """Carriles seriales con colas acotadas"""
+
+    def __init__(self, lanes, capacity=100, hol_threshold=1.0, name='sms-lane'):
+        self.lanes = lanes
+        self.hol_threshold = hol_threshold
+        self._queues = [queue.Queue(maxsize=capacity) for _ in range(lanes)]
+        self._threads = []
+        for index, q in enumerate(self._queues):
+            thread = threading.Thread(
+                target=self._run,
+                args=(index, q),
+                name=f'{name}-{index}',
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key, fn):
+        """Encolar fn en el carril del destinatario; bloquea si el carril está lleno"""
+        index = lane_for(key or '', self.lanes)
+        q = self._queues[index]
+        if q.full():
+            # Contrapresión: el prefetch de RabbitMQ acota cuánto puede durar
+            metrics.inc('sms_lane_full', lane=str(index))
+        q.put((time.monotonic(), fn))
+        metrics.set('sms_lane_depth', q.qsize(), lane=str(index))
+        return index
+
+    def depths(self):
+        return [q.qsize() for q in self._queues]
+
+    def _run(self, index, q):
+        lane = str(index)
+        while True:
+            item = q.get()
+            if item is _STOP:
+                return
+            enqueued, fn = item
+            waited = time.monotonic() - enqueued
+            metrics.observe('sms_lane_wait_seconds', waited, buckets=(0.01, 0.1, 0.5, 1, 5, 30), lane=lane)
+            if waited > self.hol_threshold:
+                metrics.inc('sms_lane_hol_blocked', lane=lane)
+            try:
+                fn()
+            except Exception:
+                # fn gestiona sus errores; un fallo aquí no debe matar el carril
+                metrics.inc('sms_lane_errors', lane=lane)
+            finally:
+                metrics.set('sms_lane_depth', q.qsize(), lane=lane)
+
+    def shutdown(self, wait=True):
+        for q in self._queues:
+            q.put(_STOP)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+class ThreadsafeChannel:
+    """Proxy de BlockingChannel usable desde los hilos de los carriles"""
+
+    def __init__(self, channel):
+        self._channel = channel
+        self._connection = channel.connection
+
+    def _call(self, method, **kwargs):
+        self._connection.add_callback_threadsafe(functools.partial(method, **kwargs))
+
+    def basic_ack(self, **kwargs):
+        self._call(self._channel.basic_ack, **kwargs)
+
+    def basic_nack(self, **kwargs):
+        self._call(self._channel.basic_nack, **kwargs)
+
+    def basic_publish(self, **kwargs):
+        self._call(self._channel.basic_publish, **kwargs)
+
+
+def declare_hash_routing(channel, exchange, hash_exchange, queue_name, routing_keys, header, weight='1'):
+    """Enrutar por destinatario entre procesos con un exchange x-consistent-hash.
+
+    El exchange de hash recibe los mensajes de `exchange` (binding
+    exchange-to-exchange) y reparte por la cabecera `header`; cada proceso
+    consume su propia cola, así un destinatario siempre llega al mismo proceso.
+    Requiere el plugin rabbitmq_consistent_hash_exchange.
+    """
+    channel.exchange_declare(
+        exchange=hash_exchange,
+        exchange_type='x-consistent-hash',
+        durable=True,
+        arguments={'hash-header': header}
+    )
+    for routing_key in routing_keys:
+        channel.exchange_bind(destination=hash_exchange, source=exchange, routing_key=routing_key)
+    channel.queue_declare(queue=queue_name, durable=True)
+    channel.queue_bind(exchange=hash_exchange, queue=queue_name, routing_key=weight)
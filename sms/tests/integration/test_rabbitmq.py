@@ -164,6 +164,55 @@ class TestRabbitMQIntegration:
         
         print("✅ Mensaje publicado con persistence")
 
+class TestLoadGeneration:
+    """Tests de carga con publisher confirms y acks agrupados"""
+
+    LOAD = 2000
+
+    @pytest.fixture
+    def load_queue(self, rabbitmq_channel):
+        queue_name = 'test_load_' + str(int(time.time() * 1000))
+        rabbitmq_channel.queue_declare(queue=queue_name, auto_delete=False)
+        rabbitmq_channel.queue_bind(exchange='auth.events', queue=queue_name, routing_key='load.sms')
+        yield queue_name
+        rabbitmq_channel.queue_delete(queue=queue_name)
+
+    def test_confirmed_load_and_coalesced_acks(self, rabbitmq_connection, rabbitmq_channel, load_queue):
+        """Test: Publicar con confirms en ventana y consumir con acks en bloque"""
+        from publisher import ConfirmingPublisher, sms_messages
+        from acks import AckCoalescer
+
+        publisher = ConfirmingPublisher(RABBITMQ_URL, 'auth.events', window=500)
+        stats = publisher.publish_many(sms_messages(self.LOAD, routing_key='load.sms'))
+        assert (stats.confirmed, stats.nacked) == (self.LOAD, 0)
+        print(f"✅ {stats.confirmed} mensajes confirmados a {stats.rate:.0f} msg/s")
+
+        depth = rabbitmq_channel.queue_declare(queue=load_queue, passive=True).method.message_count
+        assert depth == self.LOAD
+
+        channel = rabbitmq_connection.channel()
+        channel.basic_qos(prefetch_count=200)
+        acks = AckCoalescer(channel, max_batch=100)
+        received = []
+
+        def on_message(ch, method, properties, body):
+            acks.track(method.delivery_tag)
+            received.append(method.delivery_tag)
+            acks.basic_ack(delivery_tag=method.delivery_tag)
+            if len(received) == self.LOAD:
+                ch.stop_consuming()
+
+        channel.basic_consume(queue=load_queue, on_message_callback=on_message)
+        timeout = rabbitmq_connection.call_later(30, channel.stop_consuming)
+        channel.start_consuming()
+        rabbitmq_connection.remove_timeout(timeout)
+        acks.flush()
+        channel.close()
+
+        assert len(received) == self.LOAD
+        depth = rabbitmq_channel.queue_declare(queue=load_queue, passive=True).method.message_count
+        assert depth == 0
+
 class TestSMSConsumerIntegration:
     """Tests de integración del consumer de SMS"""
     
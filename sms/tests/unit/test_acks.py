@@ -0,0 +1,167 @@
+import collections
+import json
+import random
+from unittest.mock import Mock, patch
+import pika
+from acks import AckCoalescer
+from metrics import metrics
+from publisher import ConfirmTracker, sms_messages
+
+
+class FakeConnection:
+    def __init__(self):
+        self.timers = {}
+        self._ids = 0
+
+    def call_later(self, delay, fn):
+        self._ids += 1
+        self.timers[self._ids] = fn
+        return self._ids
+
+    def remove_timeout(self, timer_id):
+        self.timers.pop(timer_id, None)
+
+    def fire(self):
+        for timer_id, fn in list(self.timers.items()):
+            self.timers.pop(timer_id)
+            fn()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _coalescer(tags, max_batch=50, clock=None):
+    channel = Mock(connection=FakeConnection())
+    acks = AckCoalescer(channel, max_batch=max_batch, max_delay=0.05, max_block=1.0, clock=clock or Clock())
+    for tag in tags:
+        acks.track(tag)
+    return acks, channel
+
+
+def _acks(channel):
+    return [(c.kwargs['delivery_tag'], c.kwargs.get('multiple', False)) for c in channel.basic_ack.call_args_list]
+
+
+class TestAckCoalescer:
+    """Test suite for coalesced AMQP acks"""
+
+    def test_contiguous_prefix_acked_once_on_count(self):
+        acks, channel = _coalescer(range(1, 6), max_batch=3)
+        acks.basic_ack(delivery_tag=1)
+        acks.basic_ack(delivery_tag=2)
+        channel.basic_ack.assert_not_called()
+        acks.basic_ack(delivery_tag=3)
+        assert _acks(channel) == [(3, True)]
+
+    def test_out_of_order_completion_waits_for_gap(self):
+        acks, channel = _coalescer(range(1, 6))
+        for tag in (2, 3, 1, 5):
+            acks.basic_ack(delivery_tag=tag)
+        channel.connection.fire()
+        # 4 sigue en proceso: 1-3 en bloque, 5 espera a unirse al prefijo
+        assert _acks(channel) == [(3, True)]
+        acks.basic_ack(delivery_tag=4)
+        channel.connection.fire()
+        assert _acks(channel) == [(3, True), (5, True)]
+
+    def test_long_pending_tag_releases_completed_behind_it(self):
+        clock = Clock()
+        acks, channel = _coalescer(range(1, 5), clock=clock)
+        for tag in (2, 3):
+            acks.basic_ack(delivery_tag=tag)
+        channel.connection.fire()
+        channel.basic_ack.assert_not_called()
+        # El temporizador se rearma hasta que 1 supera max_block
+        clock.now = 1.5
+        channel.connection.fire()
+        assert _acks(channel) == [(2, False), (3, False)]
+        acks.basic_ack(delivery_tag=1)
+        acks.basic_ack(delivery_tag=4)
+        assert acks.flush() == 2
+        assert _acks(channel)[-1] == (4, True)
+
+    def test_interleaved_lanes_keep_frames_per_batch(self):
+        metrics.reset()
+        tags = range(1, 20001)
+        acks, channel = _coalescer([], max_batch=50)
+        in_flight = collections.deque()
+        rng = random.Random(7)
+        # Prefetch 100: las entregas terminan en orden aleatorio dentro de la ventana
+        for tag in tags:
+            acks.track(tag)
+            in_flight.append(tag)
+            if len(in_flight) == 100:
+                done = in_flight[rng.randrange(8)]
+                in_flight.remove(done)
+                acks.basic_ack(delivery_tag=done)
+        for tag in list(in_flight):
+            acks.basic_ack(delivery_tag=tag)
+        acks.flush()
+        counters = {c['name']: c['value'] for c in metrics.snapshot()['counters']}
+        assert counters['sms_acks'] == 20000
+        assert counters['sms_ack_frames'] <= 20000 // 50 + 1
+
+    def test_forced_flush_acks_everything_completed(self):
+        acks, channel = _coalescer(range(1, 4))
+        acks.basic_ack(delivery_tag=3)
+        assert acks.flush(force=True) == 1
+        assert _acks(channel) == [(3, False)]
+
+    def test_nack_is_immediate_and_not_reacked(self):
+        acks, channel = _coalescer(range(1, 4))
+        acks.basic_nack(delivery_tag=2, requeue=False)
+        channel.basic_nack.assert_called_once_with(delivery_tag=2, multiple=False, requeue=False)
+        acks.basic_ack(delivery_tag=1)
+        acks.basic_ack(delivery_tag=3)
+        assert acks.flush() == 2
+        assert _acks(channel) == [(3, True)]
+
+    def test_timer_scheduled_once_and_cleared(self):
+        acks, channel = _coalescer(range(1, 4))
+        acks.basic_ack(delivery_tag=1)
+        acks.basic_ack(delivery_tag=2)
+        assert len(channel.connection.timers) == 1
+        acks.flush()
+        assert channel.connection.timers == {}
+        assert acks.flush() == 0
+
+    def test_untracked_tags_pass_through(self):
+        acks, channel = _coalescer([])
+        acks.basic_ack(delivery_tag=9)
+        assert _acks(channel) == [(9, False)]
+
+    def test_consumer_routes_acks_through_coalescer(self):
+        import consumer
+        acks, channel = _coalescer([])
+        method = Mock(delivery_tag=1, routing_key='send.sms')
+        body = json.dumps({'to': '+573001234567', 'body': 'hola'}).encode()
+        with patch('consumer.acks', acks), patch('consumer.log_json'), \
+             patch('consumer.send_sms', return_value=True):
+            consumer.callback(channel, method, Mock(headers={}), body)
+        channel.basic_ack.assert_not_called()
+        acks.flush()
+        assert _acks(channel) == [(1, True)]
+
+
+class TestConfirmTracker:
+    """Test suite for publisher confirm bookkeeping"""
+
+    def test_multiple_and_single_confirms(self):
+        tracker = ConfirmTracker()
+        for _ in range(5):
+            tracker.sent()
+        assert tracker.settle(3, multiple=True, ok=True) == 3
+        assert tracker.settle(5, multiple=False, ok=False) == 1
+        assert tracker.settle(5, multiple=False, ok=True) == 0
+        assert (len(tracker), tracker.confirmed, tracker.nacked) == (1, 3, 1)
+
+    def test_sms_messages_carry_recipient_header(self):
+        routing_key, body, properties = next(sms_messages(1))
+        assert routing_key == 'send.sms'
+        assert isinstance(properties, pika.BasicProperties)
+        assert properties.headers['x-recipient'] == json.loads(body)['recipient']
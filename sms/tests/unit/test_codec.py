@@ -0,0 +1,60 @@
+import json
+import pytest
+from codec import (
+    AlertEvent, NotificationEvent, DirectMessage,
+    MalformedMessage, InvalidMessage, decode_message
+)
+
+
+class TestMessageCodec:
+    """Test suite for typed message decoding"""
+
+    def test_decodes_bytes_into_notification(self):
+        body = json.dumps({'type': 'security.login', 'recipient': '+573001234567', 'ip': '1.2.3.4'}).encode()
+        event = decode_message(body)
+        assert isinstance(event, NotificationEvent)
+        assert event.recipient == '+573001234567'
+        assert event.message is None
+        assert event.ip == '1.2.3.4'
+
+    def test_alert_selected_by_routing_key(self):
+        event = decode_message(b'{"alert_name": "HighLatency"}', routing_key='service.alert')
+        assert isinstance(event, AlertEvent)
+        assert event.alert_name == 'HighLatency'
+        assert event.service == 'unknown'
+
+    def test_direct_message_field_aliases(self):
+        event = decode_message('{"to": "+573001234567", "text": "hola"}')
+        assert isinstance(event, DirectMessage)
+        assert (event.recipient, event.message) == ('+573001234567', 'hola')
+
+    def test_records_use_slots(self):
+        event = decode_message(b'{"to": "+573001234567", "body": "hola"}')
+        assert not hasattr(event, '__dict__')
+
+    @pytest.mark.parametrize('body', [
+        b'{"recipient": "+573001234567"',
+        b'[1, 2, 3]',
+        b'\xff\xfe',
+    ])
+    def test_malformed_bodies_rejected(self, body):
+        with pytest.raises(MalformedMessage):
+            decode_message(body)
+
+    def test_size_cap_applies_before_parsing(self, monkeypatch):
+        monkeypatch.setattr('codec.MAX_MESSAGE_BYTES', 16)
+        monkeypatch.setattr('codec._loads', lambda data: pytest.fail('parsed oversized body'))
+        with pytest.raises(MalformedMessage, match='excede el límite'):
+            decode_message(b'{"to": "+573001234567", "body": "hola"}')
+
+    def test_notification_without_recipient(self):
+        with pytest.raises(InvalidMessage) as exc:
+            decode_message(b'{"type": "account.created"}')
+        assert str(exc.value) == 'Evento normal sin recipient'
+        assert exc.value.field == 'recipient'
+
+    def test_wrong_field_type_reported_precisely(self):
+        with pytest.raises(InvalidMessage) as exc:
+            decode_message(b'{"recipient": 573001234567, "message": "hola"}')
+        assert exc.value.field == 'recipient'
+        assert 'int' in str(exc.value)
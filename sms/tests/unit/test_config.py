@@ -0,0 +1,118 @@
+import json
+from unittest.mock import Mock, patch
+from codec import decode_message
+from config import ConfigStore, Settings, defaults_from_env
+
+PREFIX = 'config/sms/'
+
+
+def _entries(**values):
+    return [{'Key': PREFIX + key, 'Value': value.encode()} for key, value in values.items()]
+
+
+def _store(**kwargs):
+    return ConfigStore(defaults_from_env(), prefix=PREFIX, **kwargs)
+
+
+class FakeKV:
+    """Respuestas encoladas de kv.get (index, entries)"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def get(self, key, **kwargs):
+        self.calls.append(kwargs)
+        return self.responses.pop(0)
+
+
+class TestSettings:
+    """Test suite for configuration snapshots"""
+
+    def test_defaults_render_existing_templates(self):
+        settings = Settings(defaults_from_env())
+        assert settings.render('security.login', ip='1.2.3.4') == 'Alerta: Nuevo acceso a tu cuenta desde 1.2.3.4'
+        assert settings.render('service.alert', alert_name='HighLatency', service='auth',
+                               severity='critical', instance='auth:3500', timestamp='t').startswith('🚨 ALERTA: HighLatency')
+        assert settings.render('notification') is None
+
+    def test_unknown_template_fields_are_kept(self):
+        raw = dict(defaults_from_env(), **{'templates/security.login': 'Acceso desde {ip} ({city})'})
+        assert Settings(raw).render('security.login', ip='1.2.3.4') == 'Acceso desde 1.2.3.4 ({city})'
+
+
+class TestConfigStore:
+    """Test suite for Consul KV loading and atomic reloads"""
+
+    def test_load_overrides_env_and_notifies(self):
+        store = _store()
+        listener = Mock()
+        store.subscribe(listener)
+        client = Mock(kv=FakeKV((7, _entries(alert_recipient='+573009999999', prefetch_count='20'))))
+
+        assert store.load(client)
+        assert store.current.alert_recipient == '+573009999999'
+        assert store.current.prefetch_count == 20
+        assert store.index == 7
+        new, old, changed = listener.call_args[0]
+        assert new is store.current and old.prefetch_count == 1
+        assert changed == {'alert_recipient', 'prefetch_count'}
+
+    def test_invalid_change_keeps_previous_snapshot(self):
+        errors = []
+        store = _store(on_error=lambda message, payload: errors.append(message))
+        before = store.current
+        assert not store.apply(_entries(prefetch_count='20', rate_limits='security.login=x/600:drop'), 3)
+        assert store.current is before
+        assert errors == ['Configuración rechazada']
+
+    def test_deleted_key_reverts_to_default(self):
+        store = _store()
+        store.apply(_entries(alert_recipient='+573009999999'), 1)
+        store.apply([], 2)
+        assert store.current.alert_recipient == defaults_from_env()['alert_recipient']
+
+    def test_blocking_poll_uses_index(self):
+        kv = FakeKV((5, []), (5, []), (9, _entries(prefetch_count='4')), (2, []))
+        store = _store(wait='30s')
+        store.load(Mock(kv=kv))
+        store.poll()
+        assert store.current.prefetch_count == 1
+        store.poll()
+        assert store.current.prefetch_count == 4
+        assert kv.calls[-1] == {'recurse': True, 'index': 5, 'wait': '30s'}
+        # Índice que retrocede: reiniciar
+        store.poll()
+        assert store.index == 0
+
+    def test_unreachable_consul_keeps_env(self):
+        errors = []
+        store = _store(on_error=lambda message, payload: errors.append(message))
+        client = Mock()
+        client.kv.get.side_effect = ConnectionError('refused')
+        assert not store.load(client)
+        assert store.current.queue == defaults_from_env()['queue']
+        assert errors == ['Consul KV no disponible, usando configuración de entorno']
+
+
+class TestConsumerConfig:
+    """Test suite for hot-reloaded settings in the consumer"""
+
+    def test_templates_recipient_and_rate_limits_apply_without_restart(self):
+        import consumer
+        store = _store()
+        store.subscribe(consumer.apply_settings)
+        limiter = Mock()
+        with patch('consumer.settings', store), patch('consumer.limiter', limiter), \
+             patch('consumer.log_json'):
+            store.apply(_entries(
+                alert_recipient='+573005550000',
+                rate_limits='security.login=1/60:drop',
+                **{'templates/security.login': 'Ingreso desde {ip}'}
+            ), 11)
+            event = decode_message(json.dumps({'type': 'security.login', 'recipient': '+573001234567', 'ip': '1.2.3.4'}))
+            alert = decode_message(b'{"type": "service.alert", "alert_name": "Down"}')
+
+            assert consumer.render_message(event) == 'Ingreso desde 1.2.3.4'
+            assert consumer.resolve_recipient(alert) == '+573005550000'
+        assert limiter.policies['security.login'].limit == 1
@@ -0,0 +1,126 @@
+from unittest.mock import Mock, patch
+from twilio.request_validator import RequestValidator
+from delivery import SignatureValidator, StatusAggregator, StatusUpdate, callback_url
+from providers import ProviderRouter, TwilioProvider
+
+TOKEN = '12345'
+URL = 'https://sms.example.com/twilio/status?event_type=security.login'
+
+
+def _aggregator(**kwargs):
+    # Intervalo largo: los tests vacían el buffer a mano
+    return StatusAggregator(flush_interval=3600, **kwargs)
+
+
+def _update(sid, status, at, to='+573001234567', event_type='security.login', error_code=None):
+    return StatusUpdate(sid, status, to=to, error_code=error_code, event_type=event_type, received_at=at)
+
+
+class TestSignature:
+    """Test suite for Twilio signature validation"""
+
+    def test_matches_twilio_library(self):
+        params = {'MessageSid': 'SM1', 'MessageStatus': 'delivered', 'To': '+573001234567'}
+        signature = RequestValidator(TOKEN).compute_signature(URL, params)
+        validator = SignatureValidator(TOKEN)
+        assert validator.valid(URL, params, signature)
+        assert validator.valid(URL, params, signature)
+        assert not validator.valid(URL, dict(params, MessageStatus='failed'), signature)
+        assert not validator.valid(URL, params, None)
+
+    def test_callback_url_carries_event_type(self):
+        assert callback_url('https://h/twilio/status', 'security.login') == 'https://h/twilio/status?event_type=security.login'
+        assert callback_url('https://h/s?x=1', 'a b') == 'https://h/s?x=1&event_type=a+b'
+        assert callback_url('https://h/s', None) == 'https://h/s'
+
+
+class TestStatusAggregator:
+    """Test suite for batched delivery aggregation"""
+
+    def test_sent_to_delivered_latency_per_prefix_and_type(self):
+        aggregator = _aggregator()
+        aggregator.submit(_update('SM1', 'sent', 100.0))
+        aggregator.submit(_update('SM1', 'delivered', 103.5))
+        # Desordenados: delivered antes que sent
+        aggregator.submit(_update('SM2', 'delivered', 210.0, to='+573109999999'))
+        aggregator.submit(_update('SM2', 'sent', 200.0, to='+573109999999'))
+        assert aggregator.flush() == 4
+
+        latency = {(h['prefix'], h['event_type']): h for h in aggregator.snapshot()['latency_seconds']}
+        assert latency[('+57300', 'security.login')]['sum'] == 3.5
+        assert latency[('+57310', 'security.login')]['buckets']['10'] == 1
+
+    def test_failure_codes_counted(self):
+        aggregator = _aggregator()
+        aggregator.submit(_update('SM1', 'sent', 1.0))
+        aggregator.submit(_update('SM1', 'undelivered', 2.0, error_code='30005'))
+        aggregator.submit(_update('SM2', 'failed', 2.0, event_type=None))
+        aggregator.flush()
+
+        snapshot = aggregator.snapshot()
+        failures = {(f['event_type'], f['error_code']): f['count'] for f in snapshot['failures']}
+        assert failures == {('security.login', '30005'): 1, ('unknown', 'none'): 1}
+        assert snapshot['latency_seconds'] == []
+        assert snapshot['processed'] == 3
+
+    def test_full_buffer_drops_instead_of_blocking(self):
+        aggregator = _aggregator(max_pending=2)
+        assert aggregator.submit(_update('SM1', 'sent', 1.0))
+        assert aggregator.submit(_update('SM2', 'sent', 1.0))
+        assert not aggregator.submit(_update('SM3', 'sent', 1.0))
+        assert aggregator.snapshot()['dropped'] == 1
+        aggregator.flush()
+        assert aggregator.pending == 0
+
+    def test_tracked_sids_are_bounded(self):
+        aggregator = _aggregator(max_tracked=10)
+        for i in range(100):
+            aggregator.submit(_update(f'SM{i}', 'sent', 1.0))
+        aggregator.flush()
+        assert len(aggregator._seen) == 10
+
+
+class TestStatusEndpoint:
+    """Test suite for POST /twilio/status"""
+
+    def _post(self, client, params, signature=None):
+        url = 'http://localhost/twilio/status?event_type=security.login'
+        signature = signature or RequestValidator(TOKEN).compute_signature(url, params)
+        return client.post(url, data=params, headers={'X-Twilio-Signature': signature})
+
+    def test_signed_callback_is_enqueued(self):
+        import message
+        aggregator = _aggregator()
+        with patch('message.signature_validator', SignatureValidator(TOKEN)), \
+             patch('message.status_aggregator', aggregator):
+            client = message.app.test_client()
+            response = self._post(client, {'MessageSid': 'SM1', 'MessageStatus': 'sent', 'To': '+573001234567'})
+            assert response.status_code == 204
+            assert aggregator.pending == 1
+            assert self._post(client, {'MessageSid': 'SM1'}, signature='forged').status_code == 403
+            assert self._post(client, {'To': '+573001234567'}).status_code == 400
+
+            aggregator.flush()
+            stats = client.get('/twilio/status/stats').get_json()
+        assert stats['statuses'] == [
+            {'prefix': '+57300', 'event_type': 'security.login', 'status': 'sent', 'count': 1}
+        ]
+
+    def test_disabled_without_auth_token(self):
+        import message
+        with patch('message.signature_validator', None):
+            assert message.app.test_client().post('/twilio/status').status_code == 404
+
+
+class TestTwilioStatusCallback:
+    """Test suite for the StatusCallback requested on each Twilio send"""
+
+    def test_router_passes_event_type(self):
+        client = Mock()
+        client.messages.create.return_value = Mock(sid='SM1')
+        provider = TwilioProvider(lambda: client, '+15005550006', status_callback='https://h/twilio/status')
+        ProviderRouter([provider]).send('+573001234567', 'hola', 'security.login')
+        client.messages.create.assert_called_once_with(
+            body='hola', from_='+15005550006', to='+573001234567',
+            status_callback='https://h/twilio/status?event_type=security.login'
+        )
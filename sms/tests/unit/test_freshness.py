@@ -0,0 +1,114 @@
+import json
+import time
+from unittest.mock import Mock, patch
+import pika
+from codec import decode_message
+from freshness import BacklogMonitor, FreshnessPolicy, parse_budgets
+
+NOW = 1_000_000.0
+
+
+def _policy(**kwargs):
+    return FreshnessPolicy(parse_budgets('security.login=900,*=86400'), **kwargs)
+
+
+class TestFreshnessPolicy:
+    """Test suite for per-event-type freshness budgets"""
+
+    def test_stale_login_dropped(self):
+        event = decode_message(b'{"type": "security.login", "recipient": "+573001234567"}')
+        assert _policy().stale_reason(event, NOW - 600, NOW) is None
+        assert _policy().stale_reason(event, NOW - 3600, NOW) == 'stale'
+
+    def test_unknown_type_uses_default_budget(self):
+        event = decode_message(b'{"to": "+573001234567", "body": "hola"}')
+        assert _policy().stale_reason(event, NOW - 3600, NOW) is None
+
+    def test_expires_at_in_body(self):
+        body = json.dumps({'to': '+573001234567', 'body': 'hola', 'expires_at': NOW - 1})
+        assert _policy().stale_reason(decode_message(body), None, NOW) == 'expired'
+
+    def test_scheduled_message_ages_from_send_at(self):
+        body = json.dumps({'type': 'security.login', 'recipient': '+573001234567', 'send_at': NOW - 60})
+        assert _policy().stale_reason(decode_message(body), NOW - 7200, NOW) is None
+
+    def test_shedding_tightens_budget_and_drops_types(self):
+        policy = _policy(shed_factor=0.25, shed_drop_events=['account.created'])
+        login = decode_message(b'{"type": "security.login", "recipient": "+573001234567"}')
+        welcome = decode_message(b'{"type": "account.created", "recipient": "+573001234567"}')
+        assert policy.stale_reason(login, NOW - 600, NOW, shedding=True) == 'stale'
+        assert policy.stale_reason(welcome, NOW, NOW, shedding=True) == 'shedding'
+
+
+class TestBacklogMonitor:
+    """Test suite for backlog-driven shedding mode"""
+
+    def test_depth_threshold_with_hysteresis(self):
+        monitor = BacklogMonitor(max_depth=1000, max_lag=300)
+        assert monitor.update_depth(1500) is True
+        assert monitor.shedding
+        assert monitor.update_depth(800) is False
+        assert monitor.shedding
+        assert monitor.update_depth(400) is True
+        assert not monitor.shedding
+
+    def test_lag_threshold(self):
+        monitor = BacklogMonitor(max_depth=1000, max_lag=300, alpha=1.0)
+        monitor.observe_lag(600)
+        assert monitor.update_depth(10) is True
+        assert monitor.shedding
+
+    def test_drained_queue_resets_lag(self):
+        monitor = BacklogMonitor(max_depth=1000, max_lag=300, alpha=1.0)
+        monitor.observe_lag(7000)
+        monitor.update_depth(10)
+        assert monitor.shedding
+        assert monitor.update_depth(0) is True
+        assert (monitor.lag, monitor.shedding) == (0.0, False)
+
+
+class TestConsumerShedding:
+    """Test suite for stale-message shedding in the consumer"""
+
+    def test_stale_message_acked_without_sending(self):
+        import consumer
+        with patch('consumer.send_sms') as mock_send, \
+             patch('consumer.log_json') as mock_log:
+            ch = Mock()
+            properties = Mock(headers={'x-published-at': 1000}, timestamp=None)
+            method = Mock(routing_key='send.sms', delivery_tag=7)
+            body = json.dumps({'type': 'security.login', 'recipient': '+573001234567'}).encode()
+            consumer.callback(ch, method, properties, body)
+
+        mock_send.assert_not_called()
+        ch.basic_ack.assert_called_once_with(delivery_tag=7)
+        assert any(c[0][1] == 'Mensaje descartado por antigüedad' for c in mock_log.call_args_list)
+
+    def test_returned_scheduled_message_is_not_consume_lag(self):
+        import consumer
+        from scheduler import SCHEDULED_ROUTING_KEY_HEADER
+        monitor = BacklogMonitor(max_depth=1000, max_lag=300, alpha=1.0)
+        published_ms = (time.time() - 4 * 3600) * 1000
+        body = json.dumps({'to': '+573001234567', 'body': 'hola'}).encode()
+        with patch('consumer.backlog', monitor), \
+             patch('consumer.send_sms') as mock_send, \
+             patch('consumer.log_json'):
+            properties = Mock(headers={'x-published-at': published_ms, SCHEDULED_ROUTING_KEY_HEADER: 'send.sms'},
+                              timestamp=None)
+            consumer.process_delivery(Mock(), Mock(routing_key='messaging.sms.queue', delivery_tag=1), properties, body)
+            assert monitor.lag == 0.0
+
+            properties = Mock(headers={'x-published-at': published_ms}, timestamp=None)
+            consumer.process_delivery(Mock(), Mock(routing_key='send.sms', delivery_tag=2), properties, body)
+            assert monitor.lag > 3600
+        assert mock_send.call_count == 2
+
+    def test_existing_queue_without_ttl_is_reused(self):
+        import consumer
+        connection = Mock()
+        channel = Mock()
+        channel.queue_declare.side_effect = pika.exceptions.ChannelClosedByBroker(406, 'PRECONDITION_FAILED')
+        with patch('consumer.log_json'):
+            result = consumer.declare_main_queue(connection, channel)
+        assert result is connection.channel.return_value
+        result.queue_declare.assert_called_once_with(queue=consumer.QUEUE, durable=True, passive=True)
@@ -0,0 +1,126 @@
+from unittest.mock import Mock, patch
+from twilio.base.exceptions import TwilioRestException
+from lookup import (
+    LocalLookup, LookupCache, LookupFailed, RecipientValidator, TwilioLookup,
+    validator_from_env
+)
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class CountingLookup(LocalLookup):
+    def __init__(self):
+        self.calls = 0
+
+    def lookup(self, number):
+        self.calls += 1
+        return super().lookup(number)
+
+
+def _validator(tmp_path, clock=None, **kwargs):
+    cache = LookupCache(str(tmp_path / 'lookup.db'), clock=clock or Clock())
+    return RecipientValidator(CountingLookup(), cache, **kwargs)
+
+
+class TestLookupProviders:
+    """Test suite for lookup providers"""
+
+    def test_local_lookup_colombian_numbering(self):
+        lookup = LocalLookup()
+        assert lookup.lookup('+573001234567').line_type == 'mobile'
+        assert lookup.lookup('+576015551234').line_type == 'landline'
+        assert not lookup.lookup('+57123').valid
+        assert not lookup.lookup('57300').valid
+
+    def test_twilio_lookup(self):
+        client = Mock()
+        client.lookups.v2.phone_numbers.return_value.fetch.return_value = Mock(
+            valid=True, line_type_intelligence={'type': 'landline', 'carrier_name': 'ETB'}
+        )
+        result = TwilioLookup(lambda: client).lookup('+576015551234')
+        assert (result.valid, result.line_type, result.carrier) == (True, 'landline', 'ETB')
+
+        client.lookups.v2.phone_numbers.return_value.fetch.side_effect = TwilioRestException(404, '/x', 'Not found')
+        assert not TwilioLookup(lambda: client).lookup('+570000').valid
+
+
+class TestRecipientValidator:
+    """Test suite for cached recipient validation"""
+
+    def test_repeat_recipients_hit_memory(self, tmp_path):
+        validator = _validator(tmp_path)
+        assert validator.check('+573001234567').source == 'provider'
+        assert validator.check('+573001234567').source == 'memory'
+        assert validator.provider.calls == 1
+
+    def test_landline_and_invalid_rejected(self, tmp_path):
+        validator = _validator(tmp_path)
+        landline = validator.check('+576015551234')
+        assert (landline.deliverable, landline.reason) == (False, 'line_type')
+        assert validator.check('+5712345').reason == 'invalid'
+
+    def test_cache_survives_restart(self, tmp_path):
+        clock = Clock()
+        _validator(tmp_path, clock).check('+576015551234')
+        restarted = _validator(tmp_path, clock)
+        verdict = restarted.check('+576015551234')
+        assert (verdict.deliverable, verdict.source) == (False, 'disk')
+        assert restarted.provider.calls == 0
+
+    def test_entries_expire(self, tmp_path):
+        clock = Clock()
+        validator = _validator(tmp_path, clock, ttl=60, negative_ttl=10)
+        validator.check('+573001234567')
+        validator.check('+576015551234')
+        clock.now += 30
+        assert validator.check('+573001234567').source == 'memory'
+        assert validator.check('+576015551234').source == 'provider'
+        assert validator.cache.purge() == 0
+        clock.now += 100
+        assert validator.cache.purge() == 2
+
+    def test_lookup_failure_fails_open_without_caching(self, tmp_path):
+        validator = _validator(tmp_path)
+        validator.provider = Mock()
+        validator.provider.lookup.side_effect = LookupFailed('timeout')
+        assert validator.check('+573001234567').deliverable
+        assert validator.check('+573001234567').source == 'error'
+
+    def test_fallback_mode_only_checks_normalized_numbers(self, tmp_path):
+        validator = _validator(tmp_path, mode='fallback')
+        assert validator.applies(True)
+        assert not validator.applies(False)
+
+    def test_from_env(self, tmp_path):
+        with patch.dict('os.environ', {'SMS_LOOKUP_MODE': 'off'}):
+            assert validator_from_env(lambda: None) is None
+        env = {'SMS_LOOKUP_MODE': 'fallback', 'SMS_LOOKUP_PROVIDER': 'local',
+               'SMS_LOOKUP_CACHE_PATH': str(tmp_path / 'env.db')}
+        with patch.dict('os.environ', env):
+            validator = validator_from_env(lambda: None)
+        assert validator.mode == 'fallback'
+        assert isinstance(validator.provider, LocalLookup)
+
+
+class TestConsumerLookup:
+    """Test suite for pre-send validation in the consumer"""
+
+    def test_normalized_landline_is_not_sent(self, tmp_path):
+        import consumer
+        validator = _validator(tmp_path, mode='fallback')
+        router = Mock()
+        with patch('consumer.validator', validator), patch('consumer.router', router), \
+             patch('consumer.log_json') as mock_log:
+            consumer.send_sms('6015551234', 'hola', 'notification')
+        router.send.assert_not_called()
+        mock_log.assert_called_with(
+            'WARN',
+            'SMS descartado: destinatario no válido',
+            payload={'to': '+576015551234', 'reason': 'line_type', 'line_type': 'landline', 'event_type': 'notification'}
+        )
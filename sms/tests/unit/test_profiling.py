@@ -0,0 +1,98 @@
+import os
+import signal
+import threading
+import time
+import pytest
+from profiling import Profiler
+
+
+def _busy_work(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+class TestProfiler:
+    """Test suite for on-demand profiling captures"""
+
+    def _capture(self, profiler, **kwargs):
+        done = threading.Event()
+        result = {}
+
+        def on_complete(paths, info):
+            result['paths'] = paths
+            result['info'] = info
+            done.set()
+
+        profiler.on_complete = on_complete
+        assert profiler.trigger(**kwargs)
+        return done, result
+
+    def test_sampling_capture_writes_stacks_and_memory_diff(self, tmp_path):
+        profiler = Profiler(output_dir=str(tmp_path), duration=0.2, interval=0.005)
+        stop = threading.Event()
+        worker = threading.Thread(target=_busy_work, args=(stop,), name='busy')
+        worker.start()
+        try:
+            done, result = self._capture(profiler)
+            assert done.wait(5)
+        finally:
+            stop.set()
+            worker.join()
+
+        names = sorted(os.path.basename(p) for p in result['paths'])
+        assert any(n.endswith('stacks.collapsed') for n in names)
+        assert any(n.endswith('tracemalloc.txt') for n in names)
+        stacks = open(next(p for p in result['paths'] if p.endswith('.collapsed'))).read()
+        assert 'busy;' in stacks
+        assert result['info']['samples'] > 0
+        assert not profiler.active
+
+    def test_second_trigger_while_busy_is_rejected(self, tmp_path):
+        profiler = Profiler(output_dir=str(tmp_path), duration=0.2)
+        done, _ = self._capture(profiler)
+        assert profiler.trigger() is False
+        assert done.wait(5)
+
+    @pytest.mark.skipif(not hasattr(signal, 'setitimer'), reason='requires SIGALRM')
+    def test_cprofile_capture_on_main_thread(self, tmp_path):
+        profiler = Profiler(output_dir=str(tmp_path), duration=0.1)
+        done, result = self._capture(profiler, mode='cprofile')
+        deadline = time.monotonic() + 5
+        while not done.is_set() and time.monotonic() < deadline:
+            sum(i for i in range(1000))
+        assert done.wait(5)
+        assert any(p.endswith('cprofile.pstats') for p in result['paths'])
+
+    def test_unknown_mode_rejected(self, tmp_path):
+        with pytest.raises(ValueError):
+            Profiler(output_dir=str(tmp_path)).trigger(mode='perf')
+
+    @pytest.mark.parametrize('seconds', [0, -1, float('nan'), 301])
+    def test_out_of_range_duration_rejected(self, tmp_path, seconds):
+        profiler = Profiler(output_dir=str(tmp_path))
+        with pytest.raises(ValueError):
+            profiler.trigger(duration=seconds)
+        assert not profiler.active
+
+    def test_failed_setup_releases_lock(self, tmp_path, monkeypatch):
+        profiler = Profiler(output_dir=str(tmp_path), duration=0.1)
+
+        def broken_start(*args, **kwargs):
+            raise RuntimeError('no threads')
+
+        monkeypatch.setattr(threading.Thread, 'start', broken_start)
+        with pytest.raises(RuntimeError):
+            profiler.trigger()
+        monkeypatch.undo()
+        assert not profiler.active
+
+    def test_endpoint_rejects_bad_seconds(self):
+        import message
+        client = message.app.test_client()
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(message, 'PROFILING_TOKEN', 'secret')
+            for seconds in ('-1', '0', 'nan', '1000'):
+                response = client.post(f'/debug/profile?mode=cprofile&seconds={seconds}',
+                                       headers={'X-Profile-Token': 'secret'})
+                assert response.status_code == 400
+            assert not message.profiler.active
@@ -0,0 +1,215 @@
+import json
+import threading
+from unittest.mock import Mock, patch
+import pytest
+from twilio.base.exceptions import TwilioRestException
+from metrics import metrics
+from providers import (
+    HttpProvider, NoProviderAvailable, ProviderError, ProviderRouter, SimulatedProvider,
+    SmsProvider, TwilioProvider, router_from_env
+)
+
+
+class FakeProvider(SmsProvider):
+    def __init__(self, name, fail=None, max_concurrency=10):
+        super().__init__(max_concurrency)
+        self.name = name
+        self.fail = fail
+        self.calls = []
+
+    def send(self, to, body):
+        self.calls.append(to)
+        if self.fail:
+            raise self.fail
+        return f'{self.name}-{len(self.calls)}'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _with_latency(router, **latencies):
+    for name, latency in latencies.items():
+        router.stats[name].latency = latency
+
+
+class TestProviders:
+    """Test suite for provider implementations"""
+
+    def test_twilio_resolves_client_per_send(self):
+        client = Mock()
+        client.messages.create.return_value = Mock(sid='SM1')
+        current = {'client': None}
+        provider = TwilioProvider(lambda: current['client'], '+15005550006')
+        assert not provider.available()
+        current['client'] = client
+        assert provider.send('+573001234567', 'hola') == 'SM1'
+        client.messages.create.assert_called_once_with(body='hola', from_='+15005550006', to='+573001234567')
+
+    def test_twilio_client_errors_are_not_retryable(self):
+        client = Mock()
+        client.messages.create.side_effect = TwilioRestException(400, '/Messages', 'Invalid To')
+        with pytest.raises(ProviderError) as exc:
+            TwilioProvider(lambda: client, None).send('+1', 'x')
+        assert exc.value.provider == 'twilio'
+        assert not exc.value.retryable
+
+    def test_http_provider_posts_json(self):
+        response = Mock()
+        response.read.return_value = b'{"sid": "HTTP1"}'
+        response.__enter__ = Mock(return_value=response)
+        response.__exit__ = Mock(return_value=False)
+        with patch('providers.urllib.request.urlopen', return_value=response) as urlopen:
+            sid = HttpProvider('http://localhost:9000/sms', from_number='+1').send('+573001234567', 'hola')
+        request = urlopen.call_args[0][0]
+        assert sid == 'HTTP1'
+        assert json.loads(request.data) == {'to': '+573001234567', 'body': 'hola', 'from': '+1'}
+
+    def test_simulated_provider_error_rate(self):
+        assert SimulatedProvider().send('+1', 'x').startswith('SIM')
+        with pytest.raises(ProviderError):
+            SimulatedProvider(error_rate=1.0).send('+1', 'x')
+
+
+class TestProviderRouter:
+    """Test suite for latency- and health-aware routing"""
+
+    def test_prefers_lowest_latency(self):
+        fast, slow = FakeProvider('fast'), FakeProvider('slow')
+        router = ProviderRouter([slow, fast])
+        _with_latency(router, slow=0.8, fast=0.1)
+        assert router.send('+1', 'x').provider == 'fast'
+
+    def test_unsampled_provider_does_not_win(self):
+        router = ProviderRouter([FakeProvider('twilio'), FakeProvider('http')])
+        _with_latency(router, http=0.3)
+        assert router.send('+1', 'x').provider == 'http'
+        assert router.send('+1', 'x').provider == 'http'
+
+    def test_idle_healthy_provider_is_probed(self):
+        clock = Clock()
+        fast, slow = FakeProvider('fast'), FakeProvider('slow')
+        router = ProviderRouter([fast, slow], probe_interval=30, clock=clock)
+        _with_latency(router, fast=0.1, slow=0.8)
+        assert router.send('+1', 'x').provider == 'fast'
+        clock.now = 31
+        assert router.send('+1', 'x').provider == 'slow'
+        assert router.send('+1', 'x').provider == 'fast'
+
+    def test_simulated_never_takes_real_traffic(self):
+        broken = FakeProvider('twilio', fail=ProviderError('503', 'twilio'))
+        simulated = SimulatedProvider()
+        with pytest.raises(ProviderError):
+            ProviderRouter([broken, simulated]).send('+1', 'x')
+        router = ProviderRouter([TwilioProvider(lambda: None, None), simulated])
+        assert router.send('+1', 'x').provider == 'simulated'
+
+    def test_ties_follow_configured_order(self):
+        router = ProviderRouter([FakeProvider('twilio'), FakeProvider('http')])
+        assert [p.name for p in router.ranked()] == ['twilio', 'http']
+
+    def test_failover_on_retryable_error(self):
+        metrics.reset()
+        broken = FakeProvider('twilio', fail=ProviderError('timeout', 'twilio'))
+        backup = FakeProvider('http')
+        result = ProviderRouter([broken, backup]).send('+1', 'x')
+        assert (result.provider, result.attempts) == ('http', 2)
+        failovers = [c for c in metrics.snapshot()['counters'] if c['name'] == 'sms_provider_failover']
+        assert failovers == [{'name': 'sms_provider_failover', 'labels': {'source': 'twilio', 'target': 'http'}, 'value': 1}]
+
+    def test_non_retryable_error_does_not_fail_over(self):
+        rejected = FakeProvider('twilio', fail=ProviderError('Invalid To', 'twilio', retryable=False))
+        backup = FakeProvider('http')
+        router = ProviderRouter([rejected, backup])
+        with pytest.raises(ProviderError):
+            router.send('+1', 'x')
+        assert backup.calls == []
+        assert router.stats['twilio'].error_rate == 0.0
+
+    def test_circuit_opens_and_recovers(self):
+        clock = Clock()
+        broken = FakeProvider('twilio', fail=ProviderError('503', 'twilio'))
+        backup = FakeProvider('http')
+        router = ProviderRouter([broken, backup], failure_threshold=1, cooldown=30, clock=clock)
+        router.send('+1', 'x')
+        assert not router.healthy('twilio')
+        assert [p.name for p in router.ranked()] == ['http', 'twilio']
+
+        clock.now = 31
+        assert router.healthy('twilio')
+
+    def test_all_failing_raises_last_error(self):
+        router = ProviderRouter([
+            FakeProvider('a', fail=ProviderError('a down', 'a')),
+            FakeProvider('b', fail=RuntimeError('b down')),
+        ])
+        with pytest.raises(ProviderError) as exc:
+            router.send('+1', 'x')
+        assert exc.value.provider == 'b'
+
+    def test_concurrency_limit_spills_to_next_provider(self):
+        gate = threading.Event()
+        entered = threading.Event()
+
+        class Blocking(FakeProvider):
+            def send(self, to, body):
+                entered.set()
+                gate.wait(2)
+                return super().send(to, body)
+
+        primary = Blocking('twilio', max_concurrency=1)
+        backup = FakeProvider('http')
+        router = ProviderRouter([primary, backup])
+        worker = threading.Thread(target=router.send, args=('+1', 'x'))
+        worker.start()
+        entered.wait(2)
+        assert router.send('+2', 'y').provider == 'http'
+        gate.set()
+        worker.join()
+
+    def test_no_providers_configured(self):
+        router = ProviderRouter([TwilioProvider(lambda: None, None)])
+        assert router.active() == []
+        with pytest.raises(NoProviderAvailable):
+            router.send('+1', 'x')
+
+    def test_router_from_env(self):
+        env = {'SMS_PROVIDERS': 'twilio,simulated', 'SMS_PROVIDER_CONCURRENCY': 'twilio=2'}
+        with patch.dict('os.environ', env):
+            router = router_from_env(lambda: None, None)
+        assert [p.name for p in router.active()] == ['simulated']
+        assert router.stats['twilio'].provider.max_concurrency == 2
+        with patch.dict('os.environ', {'SMS_PROVIDERS': 'carrier-pigeon'}), pytest.raises(ValueError):
+            router_from_env(lambda: None, None)
+
+
+class TestConsumerProviders:
+    """Test suite for send_sms through the provider router"""
+
+    def test_failover_logged_with_provider(self):
+        import consumer
+        router = ProviderRouter([
+            FakeProvider('twilio', fail=ProviderError('503', 'twilio')),
+            FakeProvider('http'),
+        ])
+        with patch('consumer.router', router), patch('consumer.log_json') as mock_log:
+            consumer.send_sms('+573001234567', 'hola', 'notification')
+        message, payload = mock_log.call_args[0][1], mock_log.call_args[1]['payload']
+        assert message == 'SMS enviado exitosamente'
+        assert (payload['provider'], payload['sid'], payload['attempts']) == ('http', 'http-1', 2)
+
+    def test_provider_metrics_reach_the_log(self):
+        import consumer
+        metrics.reset()
+        router = ProviderRouter([FakeProvider('http')])
+        with patch('consumer.router', router), patch('consumer.log_json') as mock_log:
+            consumer.send_sms('+573001234567', 'hola', 'notification')
+            consumer.log_metrics()
+        message, payload = mock_log.call_args[0][1], mock_log.call_args[1]['payload']
+        assert message == 'Consumer metrics'
+        selected = [c for c in payload['counters'] if c['name'] == 'sms_provider_selected']
+        assert selected[0]['labels']['provider'] == 'http'
@@ -0,0 +1,150 @@
+import json
+from unittest.mock import Mock, patch
+import pytest
+from ratelimit import (
+    DIGEST, DELAY, DROP, MemoryRateStore, Policy, RateLimiter, parse_policies
+)
+from scheduler import TimerQueue
+
+
+class TestSlidingWindow:
+    """Test suite for the sliding-window rate store"""
+
+    def test_counts_within_window(self):
+        store = MemoryRateStore()
+        counts = [store.hit('k', 100 + i, 60)[0] for i in range(3)]
+        assert counts == [1, 2, 3]
+
+    def test_previous_window_weighted(self):
+        store = MemoryRateStore()
+        for _ in range(4):
+            store.hit('k', 10, 60)
+        # A mitad de la siguiente ventana cuenta la mitad de la anterior
+        count, window_end = store.hit('k', 90, 60)
+        assert count == pytest.approx(4 * 0.5 + 1)
+        assert window_end == 120
+
+    def test_lru_eviction_bounds_memory(self):
+        store = MemoryRateStore(max_keys=1000)
+        for i in range(5000):
+            store.hit(f'+57300{i}', 10, 60)
+        assert len(store) == 1000
+        assert store.evictions == 4000
+
+
+class TestRateLimiter:
+    """Test suite for per-recipient, per-event-type policies"""
+
+    def test_parse_policies(self):
+        policies = parse_policies('security.login=3/600:digest,*=10/3600')
+        assert policies['security.login'].action == DIGEST
+        assert policies['*'].limit == 10
+        assert policies['*'].action == DROP
+        with pytest.raises(ValueError):
+            parse_policies('x=1/60:bounce')
+
+    def test_digest_counts_suppressed(self):
+        limiter = RateLimiter({'security.login': Policy(2, 600, DIGEST)})
+        decisions = [limiter.check('security.login', '+573001234567', 1000) for _ in range(5)]
+        assert [d.allowed for d in decisions] == [True, True, False, False, False]
+        assert [d.first_suppressed for d in decisions[2:]] == [True, False, False]
+        assert limiter.take_digest('security.login', '+573001234567') == 3
+        assert limiter.take_digest('security.login', '+573001234567') == 0
+
+    def test_recipients_and_types_are_independent(self):
+        limiter = RateLimiter({'*': Policy(1, 60)})
+        assert limiter.check('security.login', '+1', 0).allowed
+        assert limiter.check('security.login', '+2', 0).allowed
+        assert limiter.check('account.created', '+1', 0).allowed
+        assert not limiter.check('security.login', '+1', 0).allowed
+
+    def test_delay_spreads_retries_over_next_windows(self):
+        limiter = RateLimiter({'*': Policy(2, 600, DELAY)})
+        decisions = [limiter.check('x', '+1', 100) for _ in range(5)]
+        assert [d.allowed for d in decisions] == [True, True, False, False, False]
+        # Un hueco cada ventana/límite tras el fin de la ventana, no todos a la vez
+        assert [d.retry_at for d in decisions[2:]] == [900, 1200, 1500]
+        # Los retrasados no cuentan en la ventana: al primer hueco se permite
+        assert limiter.check('x', '+1', 900).allowed
+
+    def test_shared_store_failure_falls_back_to_local(self):
+        broken = Mock()
+        broken.hit.side_effect = ConnectionError('redis down')
+        limiter = RateLimiter({'*': Policy(1, 60)}, store=broken)
+        assert limiter.check('x', '+1', 0).allowed
+        assert not limiter.check('x', '+1', 0).allowed
+        assert limiter.store_errors == 2
+
+
+class TestConsumerFloodProtection:
+    """Test suite for flood protection in the consumer"""
+
+    def test_login_flood_sends_digest(self):
+        import consumer
+        limiter = RateLimiter({'security.login': Policy(1, 600, DIGEST)})
+        timers = TimerQueue()
+        body = json.dumps({'type': 'security.login', 'recipient': '+573001234567', 'ip': '1.2.3.4'})
+
+        with patch('consumer.limiter', limiter), \
+             patch('consumer.timers', timers), \
+             patch('consumer.send_sms') as mock_send, \
+             patch('consumer.log_json'):
+            for _ in range(4):
+                consumer.handle_sms_message(body)
+            assert mock_send.call_count == 1
+            assert len(timers) == 1
+
+            consumer.run_due_timers(now=timers.next_deadline())
+            assert mock_send.call_count == 2
+            digest = mock_send.call_args[0][1]
+            assert digest.startswith('Alerta: 3 accesos adicionales')
+
+    def test_delay_action_defers_send(self):
+        import consumer
+        limiter = RateLimiter({'*': Policy(1, 60, DELAY)})
+        defer = Mock()
+        body = json.dumps({'to': '+573001234567', 'body': 'hola'})
+
+        with patch('consumer.limiter', limiter), \
+             patch('consumer.send_sms') as mock_send, \
+             patch('consumer.log_json'):
+            consumer.handle_sms_message(body, defer=defer)
+            consumer.handle_sms_message(body, defer=defer)
+        assert mock_send.call_count == 1
+        assert defer.call_count == 1
+
+    def test_delayed_send_rechecks_limiter_when_due(self):
+        import consumer
+        limiter = RateLimiter({'*': Policy(1, 60, DELAY)})
+        timers = TimerQueue()
+        clock = [1000.0]
+        ch = Mock()
+        properties = Mock(headers={}, timestamp=None, content_type='application/json')
+        body = json.dumps({'to': '+573001234567', 'body': 'hola'}).encode()
+
+        def deliver(tag):
+            consumer.process_delivery(ch, Mock(routing_key='send.sms', delivery_tag=tag), properties, body)
+
+        with patch('consumer.limiter', limiter), \
+             patch('consumer.timers', timers), \
+             patch('consumer.held_prefetch', None), \
+             patch('consumer.time.time', lambda: clock[0]), \
+             patch('consumer.send_sms') as mock_send, \
+             patch('consumer.log_json'):
+            deliver(1)
+            deliver(2)
+            assert mock_send.call_count == 1
+            assert timers.next_deadline() == 1080
+
+            # Otro mensaje ocupa la ventana: el retenido se retrasa otra vez sin ack
+            clock[0] = 1080.0
+            deliver(3)
+            consumer.run_due_timers(now=clock[0])
+            assert mock_send.call_count == 2
+            assert timers.next_deadline() == 1200
+            assert [c[1]['delivery_tag'] for c in ch.basic_ack.call_args_list] == [1, 3]
+
+            clock[0] = 1200.0
+            consumer.run_due_timers(now=clock[0])
+            assert mock_send.call_count == 3
+            ch.basic_ack.assert_called_with(delivery_tag=2)
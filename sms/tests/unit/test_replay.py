@@ -0,0 +1,126 @@
+import json
+import random
+from unittest.mock import patch
+import pytest
+from replay import (
+    Anonymizer, anonymize_records, main, read_capture, records_from_logs,
+    replay, schedule, write_capture
+)
+
+
+def _log_line(timestamp, raw, message='Mensaje recibido'):
+    rec = {'timestamp': timestamp, 'level': 'INFO', 'service': 'sms', 'message': message, 'payload': {'raw': raw}}
+    return 'sms-consumer-1  | ' + json.dumps(rec, ensure_ascii=False)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestCapture:
+    """Test suite for building capture files"""
+
+    def test_records_from_consumer_logs(self):
+        login = json.dumps({'type': 'security.login', 'recipient': '+573001234567'})
+        alert = json.dumps({'type': 'service.alert', 'service': 'auth'})
+        lines = [
+            _log_line('2025-11-10T12:00:00.000000Z', login),
+            _log_line('2025-11-10T12:00:00.500000Z', 'ignorado', message='Procesando SMS'),
+            'texto sin json',
+            _log_line('2025-11-10T12:00:02.250000Z', alert),
+        ]
+        records = list(records_from_logs(lines))
+        assert [(r['t'], r['rk']) for r in records] == [(0.0, 'send.sms'), (2.25, 'service.alert')]
+        assert records[0]['body'] == login
+
+    def test_gzip_round_trip(self, tmp_path):
+        path = str(tmp_path / 'capture.jsonl.gz')
+        records = [{'t': 1.5, 'rk': 'send.sms', 'body': 'b'}, {'t': 0.0, 'rk': 'send.sms', 'body': 'á'}]
+        assert write_capture(path, records) == 2
+        assert [r['t'] for r in read_capture(path)] == [0.0, 1.5]
+
+
+class TestAnonymizer:
+    """Test suite for recipient anonymization"""
+
+    def test_stable_fictional_numbers(self):
+        anon = Anonymizer('sal')
+        first = anon.recipient('+573001234567')
+        assert first == Anonymizer('sal').recipient('+573001234567')
+        assert first != anon.recipient('+573009999999')
+        assert first.startswith('+1555') and len(first) == 12
+
+    def test_distinct_recipients_never_collide(self):
+        anon = Anonymizer('sal', space=50)
+        numbers = {anon.recipient(f'+57300{i:07d}') for i in range(50)}
+        assert len(numbers) == 50
+        assert anon.recipient('+573000000007') in numbers
+        with pytest.raises(ValueError):
+            anon.recipient('+573109999999')
+
+    def test_rewrites_recipient_fields_only(self):
+        anon = Anonymizer('sal')
+        body = json.dumps({'to': '+573001234567', 'body': 'hola'})
+        (record,) = anonymize_records([{'t': 0, 'rk': 'send.sms', 'body': body}], anon)
+        data = json.loads(record['body'])
+        assert data == {'to': anon.recipient('+573001234567'), 'body': 'hola'}
+        assert anon.body('no es json') == 'no es json'
+
+
+class TestReplay:
+    """Test suite for paced replay"""
+
+    RECORDS = [{'t': float(t), 'rk': 'send.sms', 'body': str(t)} for t in (0, 1, 3)]
+
+    def test_speed_scales_recorded_offsets(self):
+        assert [o for o, _ in schedule(self.RECORDS, speed=2)] == [0.0, 0.5, 1.5]
+
+    def test_fixed_rps_ignores_recorded_offsets(self):
+        assert [o for o, _ in schedule(self.RECORDS, rps=10)] == [0.0, 0.1, 0.2]
+        poisson = [o for o, _ in schedule(self.RECORDS * 100, rps=10, arrivals='poisson', rng=random.Random(1))]
+        assert 20 < poisson[-1] < 40
+
+    def test_publishes_on_schedule(self):
+        clock = FakeClock()
+        sent = []
+        stats = replay(self.RECORDS, lambda rk, body: sent.append((clock.now, body)),
+                       speed=1, clock=clock, sleep=clock.sleep)
+        assert sent == [(0.0, '0'), (1.0, '1'), (3.0, '3')]
+        assert stats['sent'] == 3
+        assert stats['max_lag'] == 0.0
+
+    def test_open_loop_measures_lag_instead_of_slowing_down(self):
+        clock = FakeClock()
+
+        def slow_publish(rk, body):
+            clock.now += 0.5
+
+        stats = replay(self.RECORDS, slow_publish, rps=10, clock=clock, sleep=clock.sleep)
+        assert stats['sent'] == 3
+        assert stats['max_lag'] == 0.8
+
+    def test_dry_run_cli(self, tmp_path, capsys):
+        path = str(tmp_path / 'capture.jsonl')
+        body = json.dumps({'recipient': '+573001234567', 'message': 'hola'})
+        write_capture(path, [{'t': 0.0, 'rk': 'send.sms', 'body': body}])
+        assert main(['replay', path, '--rps', '1000', '--loop', '2', '--anonymize', '--dry-run']) == 0
+        lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        assert len(lines) == 2
+        assert '+573001234567' not in lines[0]['body']
+
+    def test_broker_replay_sleeps_on_the_connection(self, tmp_path):
+        path = str(tmp_path / 'capture.jsonl')
+        write_capture(path, [{'t': 0.0, 'rk': 'send.sms', 'body': '{}'}])
+        with patch('pika.BlockingConnection') as connection, \
+             patch('replay.replay', return_value={}) as run:
+            assert main(['replay', path]) == 0
+        # connection.sleep atiende heartbeats mientras espera
+        assert run.call_args.kwargs['sleep'] is connection.return_value.sleep
+        connection.return_value.close.assert_called_once_with()
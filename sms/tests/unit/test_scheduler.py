@@ -0,0 +1,199 @@
+import json
+import time
+from datetime import datetime
+from unittest.mock import Mock, patch
+from zoneinfo import ZoneInfo
+import pytest
+from codec import decode_message, InvalidMessage
+from scheduler import (
+    TimerQueue, HeldPrefetch, QuietHours, delivery_time, pick_bucket, parse_buckets
+)
+
+BOGOTA = ZoneInfo('America/Bogota')
+
+
+def _ts(*args):
+    return datetime(*args, tzinfo=BOGOTA).timestamp()
+
+
+class TestTimerQueue:
+    """Test suite for the in-process timer heap"""
+
+    def test_pops_due_actions_in_order(self):
+        timers = TimerQueue()
+        timers.schedule(30, 'c')
+        timers.schedule(10, 'a')
+        timers.schedule(20, 'b')
+        timers.schedule(10, 'a2')
+        assert timers.next_deadline() == 10
+        assert timers.pop_due(20) == ['a', 'a2', 'b']
+        assert len(timers) == 1
+
+    def test_handles_many_timers(self):
+        timers = TimerQueue()
+        for i in range(100000):
+            timers.schedule(100000 - i, i)
+        assert len(timers.pop_due(50000)) == 50000
+        assert timers.next_deadline() == 50001
+
+
+class TestDeliveryTime:
+    """Test suite for send_at, not_before and quiet hours"""
+
+    def test_quiet_hours_crossing_midnight(self):
+        quiet = QuietHours.parse('22:00-07:00', 'America/Bogota')
+        assert quiet.next_allowed(_ts(2025, 11, 10, 23, 30)) == _ts(2025, 11, 11, 7, 0)
+        assert quiet.next_allowed(_ts(2025, 11, 11, 3, 0)) == _ts(2025, 11, 11, 7, 0)
+        assert quiet.next_allowed(_ts(2025, 11, 11, 12, 0)) == _ts(2025, 11, 11, 12, 0)
+
+    def test_send_at_in_future(self):
+        event = decode_message(json.dumps({'to': '+573001234567', 'body': 'hola', 'send_at': 2000}))
+        assert delivery_time(event, 1000, quiet_hours=None) == 2000
+        assert delivery_time(event, 3000, quiet_hours=None) is None
+
+    def test_iso_not_before_and_quiet_hours(self):
+        quiet = QuietHours.parse('22:00-07:00', 'America/Bogota')
+        now = _ts(2025, 11, 10, 21, 0)
+        event = decode_message(json.dumps({
+            'type': 'account.created',
+            'recipient': '+573001234567',
+            'not_before': '2025-11-10T22:30:00-05:00'
+        }))
+        assert delivery_time(event, now, quiet, {'account.created'}) == _ts(2025, 11, 11, 7, 0)
+
+    def test_urgent_and_alerts_bypass_quiet_hours(self):
+        quiet = QuietHours.parse('00:00-23:59', 'America/Bogota')
+        urgent = decode_message(b'{"type": "account.created", "recipient": "+573001234567", "urgent": true}')
+        alert = decode_message(b'{"type": "service.alert"}')
+        assert delivery_time(urgent, time.time(), quiet, {'account.created'}) is None
+        assert delivery_time(alert, time.time(), quiet, {'service.alert'}) is None
+
+    def test_naive_timestamp_rejected(self):
+        with pytest.raises(InvalidMessage) as exc:
+            decode_message(b'{"to": "+573001234567", "body": "x", "send_at": "2025-11-10T22:30:00"}')
+        assert exc.value.field == 'send_at'
+
+    def test_pick_bucket(self):
+        buckets = parse_buckets('300,60,3600')
+        assert buckets == [60, 300, 3600]
+        assert pick_bucket(7200, buckets) == 3600
+        assert pick_bucket(400, buckets) == 300
+        assert pick_bucket(10, buckets) == 60
+
+
+class TestHeldPrefetch:
+    """Test suite for QoS that follows the held deliveries"""
+
+    def _prefetch(self, base=1):
+        connection = Mock()
+        connection.add_callback_threadsafe.side_effect = lambda fn: fn()
+        channel = Mock()
+        return HeldPrefetch(connection, channel, base), channel
+
+    def test_grows_only_while_held(self):
+        prefetch, channel = self._prefetch()
+        assert prefetch.apply() == 1
+        prefetch.hold()
+        prefetch.hold()
+        prefetch.release()
+        prefetch.release()
+        qos = [c.kwargs['prefetch_count'] for c in channel.basic_qos.call_args_list]
+        assert qos == [1, 2, 3, 2, 1]
+
+    def test_hot_reload_keeps_held_on_top(self):
+        prefetch, channel = self._prefetch()
+        prefetch.hold()
+        prefetch.set_base(20)
+        channel.basic_qos.assert_called_with(prefetch_count=21)
+        # Sin cambios no se reenvía basic_qos
+        calls = channel.basic_qos.call_count
+        prefetch.set_base(20)
+        assert channel.basic_qos.call_count == calls
+
+
+class TestConsumerScheduling:
+    """Test suite for held and parked deliveries in the consumer callback"""
+
+    def _deliver(self, consumer, payload, tag=1):
+        ch = Mock()
+        method = Mock(routing_key='send.sms', delivery_tag=tag)
+        properties = Mock(headers={}, timestamp=None, content_type='application/json')
+        consumer.callback(ch, method, properties, json.dumps(payload).encode())
+        return ch
+
+    def test_short_delay_held_without_ack_until_due(self):
+        import consumer
+        with patch('consumer.timers', TimerQueue()), \
+             patch('consumer.send_sms') as mock_send, \
+             patch('consumer.log_json'):
+            due = time.time() + 5
+            ch = self._deliver(consumer, {'to': '+573001234567', 'body': 'hola', 'send_at': due})
+            ch.basic_ack.assert_not_called()
+            mock_send.assert_not_called()
+
+            consumer.run_due_timers(now=due + 1)
+            mock_send.assert_called_once_with('+573001234567', 'hola', None)
+            ch.basic_ack.assert_called_once_with(delivery_tag=1)
+
+    def test_held_delivery_extends_qos_until_acked(self):
+        import consumer
+        prefetch = Mock()
+        with patch('consumer.timers', TimerQueue()), \
+             patch('consumer.held_prefetch', prefetch), \
+             patch('consumer.send_sms'), \
+             patch('consumer.log_json'):
+            due = time.time() + 5
+            self._deliver(consumer, {'to': '+573001234567', 'body': 'hola', 'send_at': due})
+            prefetch.hold.assert_called_once_with()
+            prefetch.release.assert_not_called()
+            consumer.run_due_timers(now=due + 1)
+            prefetch.release.assert_called_once_with()
+
+    def test_long_delay_parked_in_bucket_queue(self):
+        import consumer
+        with patch('consumer.timers', TimerQueue()), \
+             patch('consumer.send_sms') as mock_send, \
+             patch('consumer.log_json'):
+            ch = self._deliver(consumer, {'to': '+573001234567', 'body': 'hola', 'send_at': time.time() + 7200})
+            mock_send.assert_not_called()
+            publish = ch.basic_publish.call_args[1]
+            assert publish['routing_key'] == consumer.QUEUE + '.delay.3600s'
+            assert publish['properties'].headers['x-sms-routing-key'] == 'send.sms'
+            ch.basic_ack.assert_called_once_with(delivery_tag=1)
+
+    def test_park_return_cycle_counts_rate_limit_once(self):
+        import consumer
+        from ratelimit import Policy, RateLimiter
+        limiter = RateLimiter({'account.created': Policy(2, 3600)})
+        clock = [1_000_000.0]
+        body = json.dumps({
+            'type': 'account.created', 'recipient': '+573001234567', 'message': 'hola',
+            'send_at': clock[0] + 1800
+        }).encode()
+        with patch('consumer.timers', TimerQueue()), \
+             patch('consumer.limiter', limiter), \
+             patch('consumer.time.time', lambda: clock[0]), \
+             patch('consumer.send_sms') as mock_send, \
+             patch('consumer.log_json'):
+            headers = {}
+            for step in range(3):
+                ch = Mock()
+                method = Mock(routing_key='send.sms', delivery_tag=step + 1)
+                consumer.process_delivery(ch, method, Mock(headers=headers, timestamp=None), body)
+                if step < 2:
+                    publish = ch.basic_publish.call_args[1]
+                    assert publish['routing_key'] == consumer.consume_queue + '.delay.900s'
+                    headers = publish['properties'].headers
+                    clock[0] += 900
+        mock_send.assert_called_once_with('+573001234567', 'hola', 'account.created')
+        assert limiter.check('account.created', '+573001234567', clock[0]).allowed
+
+    def test_parked_in_consumed_queue_buckets_in_hash_mode(self):
+        import consumer
+        with patch('consumer.timers', TimerQueue()), \
+             patch('consumer.consume_queue', 'messaging.sms.queue.sms-1'), \
+             patch('consumer.send_sms'), \
+             patch('consumer.log_json'):
+            ch = self._deliver(consumer, {'to': '+573001234567', 'body': 'hola', 'send_at': time.time() + 7200})
+            publish = ch.basic_publish.call_args[1]
+            assert publish['routing_key'] == 'messaging.sms.queue.sms-1.delay.3600s'
@@ -0,0 +1,72 @@
+import pytest
+from segments import (
+    GSM7, UCS2, analyze, transliterate, truncate, optimize, parse_budgets
+)
+
+
+class TestSegmentAnalysis:
+    """Test suite for SMS encoding and segment counting"""
+
+    def test_plain_ascii_is_gsm7_single_segment(self):
+        info = analyze('Tu contraseña ha sido cambiada exitosamente')
+        assert info.encoding == GSM7
+        assert info.segments == 1
+
+    def test_gsm7_multipart_uses_153_per_segment(self):
+        assert analyze('a' * 160).segments == 1
+        assert analyze('a' * 161).segments == 2
+        assert analyze('a' * 306).segments == 2
+        assert analyze('a' * 307).segments == 3
+
+    def test_extension_chars_count_double(self):
+        info = analyze('€' * 80)
+        assert info.encoding == GSM7
+        assert info.units == 160
+        assert info.segments == 1
+
+    def test_emoji_forces_ucs2(self):
+        info = analyze('🚨 ALERTA: ' + 'x' * 60)
+        assert info.encoding == UCS2
+        # El emoji ocupa un par sustituto
+        assert info.units == 71
+        assert info.segments == 2
+
+    def test_accented_vowel_forces_ucs2(self):
+        assert analyze('Sesión iniciada').encoding == UCS2
+
+
+class TestSegmentOptimization:
+    """Test suite for transliteration and segment budgets"""
+
+    def test_transliterate_drops_emoji_and_maps_accents(self):
+        result = transliterate('🚨 ALERTA: Sesión “nueva” – ¡hola!')
+        assert result == 'ALERTA: Sesion "nueva" - ¡hola!'
+        assert analyze(result).encoding == GSM7
+
+    def test_truncate_respects_budget(self):
+        text = ' '.join(['palabra'] * 60)
+        result = truncate(text, 1)
+        assert analyze(result).segments == 1
+        assert result.endswith('...')
+        assert not result[:-3].endswith(' ')
+
+    def test_optimize_prefers_transliteration_over_truncation(self):
+        text = '🚨 ALERTA: ' + 'a' * 120
+        result, info, truncated = optimize(text, 'service.alert', budgets={'service.alert': 1})
+        assert not truncated
+        assert info.encoding == GSM7
+        assert info.segments == 1
+        assert result.startswith('ALERTA:')
+
+    def test_optimize_keeps_short_message_untouched(self):
+        result, info, truncated = optimize('Test SMS message', 'notification', transliterate_text=False)
+        assert result == 'Test SMS message'
+        assert not truncated
+
+    @pytest.mark.parametrize('raw,expected', [
+        ('service.alert=2,security.login=1', {'service.alert': 2, 'security.login': 1}),
+        ('bad,x=y,ok=3', {'ok': 3}),
+        ('', {}),
+    ])
+    def test_parse_budgets(self, raw, expected):
+        assert parse_budgets(raw) == expected
@@ -0,0 +1,113 @@
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from unittest.mock import Mock, patch
+from sharding import ShardedExecutor, ThreadsafeChannel, jump_hash, lane_for
+
+
+class TestConsistentHashing:
+    """Test suite for recipient → lane assignment"""
+
+    def test_lane_is_stable_and_in_range(self):
+        assert lane_for('+573001234567', 8) == lane_for('+573001234567', 8)
+        assert all(0 <= lane_for(f'+57300{i}', 8) < 8 for i in range(1000))
+
+    def test_keys_spread_across_lanes(self):
+        counts = Counter(lane_for(f'+57300{i:07d}', 8) for i in range(8000))
+        assert len(counts) == 8
+        assert min(counts.values()) > 700
+
+    def test_adding_a_lane_moves_few_keys(self):
+        keys = range(10000)
+        moved = sum(1 for k in keys if jump_hash(k, 8) != jump_hash(k, 9))
+        # Idealmente 1/9 de las claves
+        assert moved < 10000 * 0.15
+
+
+class TestShardedExecutor:
+    """Test suite for per-recipient ordered execution"""
+
+    def test_preserves_order_per_recipient(self):
+        executor = ShardedExecutor(lanes=4, capacity=1000)
+        seen = defaultdict(list)
+        lock = threading.Lock()
+
+        def record(recipient, seq):
+            time.sleep(0.0005)
+            with lock:
+                seen[recipient].append(seq)
+
+        for seq in range(50):
+            for recipient in ('+1', '+2', '+3', '+4', '+5'):
+                executor.submit(recipient, lambda r=recipient, s=seq: record(r, s))
+        executor.shutdown()
+
+        for recipient, seqs in seen.items():
+            assert seqs == list(range(50)), recipient
+
+    def test_runs_lanes_concurrently(self):
+        executor = ShardedExecutor(lanes=4)
+        started = threading.Barrier(2, timeout=2)
+        keys = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
+        first = keys[0]
+        other = next(k for k in keys if lane_for(k, 4) != lane_for(first, 4))
+        results = []
+
+        executor.submit(first, lambda: results.append(started.wait()))
+        executor.submit(other, lambda: results.append(started.wait()))
+        executor.shutdown()
+        assert len(results) == 2
+
+    def test_threadsafe_channel_defers_to_connection_thread(self):
+        channel = Mock()
+        proxy = ThreadsafeChannel(channel)
+        proxy.basic_ack(delivery_tag=3)
+        channel.basic_ack.assert_not_called()
+        scheduled = channel.connection.add_callback_threadsafe.call_args[0][0]
+        scheduled()
+        channel.basic_ack.assert_called_once_with(delivery_tag=3)
+
+
+class TestConsumerSharding:
+    """Test suite for the sharded consumer callback"""
+
+    def test_callback_dispatches_by_recipient_and_acks_threadsafe(self):
+        import consumer
+        executor = ShardedExecutor(lanes=2)
+        ch = Mock()
+        sent = []
+        with patch('consumer.lanes', executor), \
+             patch('consumer.send_sms', side_effect=lambda r, m, t: sent.append((r, m))), \
+             patch('consumer.log_json'):
+            for i in range(3):
+                body = json.dumps({'to': '+573001234567', 'body': f'msg {i}'}).encode()
+                method = Mock(routing_key='send.sms', delivery_tag=i + 1)
+                consumer.callback(ch, method, Mock(headers={}, timestamp=None), body)
+            executor.shutdown()
+
+        assert [m for _, m in sent] == ['msg 0', 'msg 1', 'msg 2']
+        ch.basic_ack.assert_not_called()
+        assert ch.connection.add_callback_threadsafe.call_count == 3
+
+    def test_due_timers_run_in_recipient_lane(self):
+        import consumer
+        from scheduler import TimerQueue
+        executor = ShardedExecutor(lanes=4)
+        timers = TimerQueue()
+        threads = []
+        with patch('consumer.lanes', executor), \
+             patch('consumer.timers', timers), \
+             patch('consumer.held_prefetch', None), \
+             patch('consumer.send_sms', side_effect=lambda r, m, t: threads.append(threading.current_thread().name)), \
+             patch('consumer.log_json'):
+            due = time.time() + 5
+            body = json.dumps({'to': '+573001234567', 'body': 'hola', 'send_at': due}).encode()
+            consumer.callback(Mock(), Mock(routing_key='send.sms', delivery_tag=1), Mock(headers={}, timestamp=None), body)
+            deadline = time.monotonic() + 2
+            while not len(timers) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            consumer.run_due_timers(now=due + 1)
+            executor.shutdown()
+
+        assert threads == [f'sms-lane-{lane_for("+573001234567", 4)}']
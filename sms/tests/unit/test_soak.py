@@ -0,0 +1,68 @@
+import json
+import logging
+import random
+import pytest
+from soak import MessageFactory, evaluate, kendall_tau, main, parse_mix, slope_per_hour
+
+
+def _samples(rss, p99=None, step=60):
+    p99 = p99 or [2.0] * len(rss)
+    return [
+        {'t': i * step, 'rss_mb': value, 'traced_mb': 1.0, 'p99_ms': latency}
+        for i, (value, latency) in enumerate(zip(rss, p99))
+    ]
+
+
+class TestSoakAnalysis:
+    """Test suite for soak growth and drift detection"""
+
+    def test_kendall_tau_and_slope(self):
+        assert kendall_tau([1, 2, 3, 4]) == 1.0
+        assert kendall_tau([4, 3, 2, 1]) == -1.0
+        assert abs(kendall_tau([1, 3, 2, 4, 3, 5])) < 1.0
+        assert slope_per_hour([0, 1800, 3600], [10, 15, 20]) == pytest.approx(10.0)
+
+    def test_steady_memory_passes(self):
+        rss = [40 + (i % 3) * 0.5 for i in range(20)]
+        assert evaluate(_samples(rss)) == []
+
+    def test_monotonic_growth_fails(self):
+        rss = [40 + i for i in range(20)]
+        failures = evaluate(_samples(rss))
+        assert len(failures) == 1 and failures[0].startswith('rss_mb crece 60.0 MB/h')
+
+    def test_warmup_growth_is_ignored(self):
+        rss = [10, 20, 30, 40] + [40.0] * 16
+        assert evaluate(_samples(rss), warmup=0.2) == []
+
+    def test_latency_drift_fails(self):
+        p99 = [2.0] * 10 + [6.0] * 10
+        failures = evaluate(_samples([40.0] * 20, p99))
+        assert failures == ['p99 pasa de 2.00 ms a 6.00 ms']
+
+    def test_message_mix(self):
+        factory = MessageFactory(parse_mix('security.login=1,direct=1'), recipients=5, rng=random.Random(3))
+        keys = {factory.next()[0] for _ in range(50)}
+        assert keys == {'send.sms'}
+        with pytest.raises(ValueError):
+            parse_mix('')
+
+
+@pytest.mark.slow
+class TestSoakRun:
+    """Test suite for a short soak run against the in-process channel"""
+
+    def test_short_run_reports(self, capsys, monkeypatch):
+        for var in ('TWILIO_ACCOUNT_SID', 'TWILIO_AUTH_TOKEN'):
+            monkeypatch.delenv(var, raising=False)
+        logger = logging.getLogger('sms')
+        level = logger.level
+        try:
+            code = main(['--duration', '2', '--rps', '200', '--sample-interval', '0.25', '--seed', '1'])
+        finally:
+            logger.setLevel(level)
+        out = capsys.readouterr().out
+        report = json.loads(out[out.index('{\n'):])
+        assert report['messages'] > 0
+        assert report['acked'] + report['nacked'] == report['messages']
+        assert code == (0 if report['passed'] else 1)
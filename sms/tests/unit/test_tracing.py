@@ -0,0 +1,123 @@
+import json
+import time
+from unittest.mock import Mock, patch
+from tracing import (
+    BatchSpanProcessor, JsonlFileExporter, NoopExporter, SpanExporter, Tracer, extract
+)
+
+
+class MemoryExporter(SpanExporter):
+    def __init__(self):
+        self.batches = []
+
+    def export(self, spans):
+        self.batches.append(list(spans))
+
+    @property
+    def spans(self):
+        return [span for batch in self.batches for span in batch]
+
+
+class TestTraceContext:
+    """Test suite for trace context extraction"""
+
+    def test_extract_w3c_traceparent(self):
+        ctx = extract({'traceparent': b'00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01'})
+        assert ctx.trace_id == '4bf92f3577b34da6a3ce929d0e0e4736'
+        assert ctx.span_id == '00f067aa0ba902b7'
+        assert ctx.sampled
+
+    def test_extract_custom_headers(self):
+        ctx = extract({'x-trace-id': '4bf92f3577b34da6a3ce929d0e0e4736'})
+        assert ctx.trace_id == '4bf92f3577b34da6a3ce929d0e0e4736'
+        assert ctx.span_id is None
+
+    def test_invalid_or_missing_headers(self):
+        assert extract(None) is None
+        assert extract({'traceparent': '00-' + '0' * 32 + '-00f067aa0ba902b7-01'}) is None
+        assert extract({'traceparent': 'garbage'}) is None
+
+
+class TestSpans:
+    """Test suite for span recording and batch export"""
+
+    def test_child_spans_share_trace_and_parent(self):
+        exporter = MemoryExporter()
+        processor = BatchSpanProcessor(exporter, max_batch_size=100)
+        tracer = Tracer(processor)
+
+        root = tracer.start_trace(
+            'sms.consume',
+            {'traceparent': '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01'}
+        )
+        with tracer.activate(root):
+            with tracer.span('sms.decode'):
+                pass
+        root.end()
+        processor.flush()
+
+        decode, consume = exporter.spans
+        assert consume.parent_id == '00f067aa0ba902b7'
+        assert decode.trace_id == consume.trace_id == '4bf92f3577b34da6a3ce929d0e0e4736'
+        assert decode.parent_id == consume.span_id
+
+    def test_span_records_error(self):
+        exporter = MemoryExporter()
+        processor = BatchSpanProcessor(exporter)
+        tracer = Tracer(processor)
+        try:
+            with tracer.span('twilio.send'):
+                raise RuntimeError('boom')
+        except RuntimeError:
+            pass
+        processor.flush()
+        assert exporter.spans[0].status == 'ERROR'
+
+    def test_jsonl_exporter_writes_otlp_lines(self, tmp_path):
+        path = tmp_path / 'traces.jsonl'
+        processor = BatchSpanProcessor(JsonlFileExporter(str(path)), max_batch_size=2)
+        tracer = Tracer(processor)
+        for name in ('a', 'b', 'c'):
+            with tracer.span(name):
+                pass
+        processor.shutdown()
+
+        lines = path.read_text().splitlines()
+        assert len(lines) == 2
+        spans = json.loads(lines[0])['resourceSpans'][0]['scopeSpans'][0]['spans']
+        assert [s['name'] for s in spans] == ['a', 'b']
+
+    def test_otlp_json_encoding(self):
+        span = Tracer(BatchSpanProcessor(NoopExporter())).start_trace('sms.consume', attributes={'queue': 'q', 'attempt': 2})
+        span.record_error(ValueError('x'))
+        span.end(span.start_ns + 5)
+        data = span.to_dict()
+        assert data['attributes'] == [
+            {'key': 'queue', 'value': {'stringValue': 'q'}},
+            {'key': 'attempt', 'value': {'intValue': '2'}}
+        ]
+        assert data['status'] == {'code': 2, 'message': 'x'}
+        assert int(data['endTimeUnixNano']) - int(data['startTimeUnixNano']) == 5
+
+
+class TestCallbackTracing:
+    """Test suite for per-stage spans in the consumer callback"""
+
+    def test_callback_records_stage_spans(self):
+        import consumer
+        exporter = MemoryExporter()
+        processor = BatchSpanProcessor(exporter)
+
+        with patch.object(consumer.tracer, 'processor', processor), \
+             patch('consumer.twilio_client', None), \
+             patch('consumer.log_json'):
+            properties = Mock(headers={'x-published-at': int(time.time() * 1000) - 50}, timestamp=None)
+            method = Mock(routing_key='send.sms', delivery_tag=1)
+            body = json.dumps({'recipient': '+573001234567', 'message': 'hola'}).encode()
+            consumer.callback(Mock(), method, properties, body)
+        processor.flush()
+
+        names = {span.name for span in exporter.spans}
+        assert {'rabbitmq.queue_wait', 'sms.decode', 'sms.route', 'sms.render',
+                'twilio.simulated', 'sms.consume'} <= names
+        assert len({span.trace_id for span in exporter.spans}) == 1
@@ -0,0 +1,315 @@
+"""
+Propagación de contexto de traza y spans por etapa para el consumer SMS.
+
+Extrae el contexto W3C `traceparent` (o las cabeceras propias x-trace-id /
+x-parent-span-id) de properties.headers, crea spans para cada etapa del
+procesamiento y los exporta en lotes mediante un exportador intercambiable.
+"""
+import atexit
+import collections
+import contextlib
+import contextvars
+import json
+import os
+import re
+import secrets
+import threading
+import time
+
+TRACEPARENT_RE = re.compile(r'^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+HEX32_RE = re.compile(r'^[0-9a-f]{32}$')
+HEX16_RE = re.compile(r'^[0-9a-f]{16}$')
+INVALID_TRACE_ID = '0' * 32
+INVALID_SPAN_ID = '0' * 16
+
+# Status.StatusCode de OTLP
+STATUS_CODES = {'UNSET': 0, 'OK': 1, 'ERROR': 2}
+
+_current_span = contextvars.ContextVar('sms_current_span', default=None)
+
+
+def _header(headers, name):
+    value = headers.get(name)
+    if isinstance(value, bytes):
+        value = value.decode('ascii', errors='ignore')
+    return value.strip().lower() if isinstance(value, str) else None
+
+
+def any_value(value):
+    """AnyValue de OTLP/JSON (los enteros de 64 bits van como string)"""
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    if isinstance(value, (list, tuple)):
+        return {'arrayValue': {'values': [any_value(v) for v in value]}}
+    return {'stringValue': '' if value is None else str(value)}
+
+
+def key_values(mapping):
+    """Lista de KeyValue de OTLP/JSON a partir de un dict"""
+    return [{'key': str(key), 'value': any_value(value)} for key, value in mapping.items()]
+
+
+class SpanContext:
+    """Identificadores de traza recibidos del productor"""
+
+    __slots__ = ('trace_id', 'span_id', 'sampled')
+
+    def __init__(self, trace_id, span_id, sampled=True):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+
+def extract(headers):
+    """Obtener el SpanContext de las cabeceras AMQP (o None)"""
+    if not headers:
+        return None
+
+    traceparent = _header(headers, 'traceparent')
+    if traceparent:
+        match = TRACEPARENT_RE.match(traceparent)
+        if match:
+            version, trace_id, span_id, flags = match.groups()
+            if version != 'ff' and trace_id != INVALID_TRACE_ID and span_id != INVALID_SPAN_ID:
+                return SpanContext(trace_id, span_id, bool(int(flags, 16) & 0x01))
+
+    trace_id = _header(headers, 'x-trace-id')
+    if trace_id and HEX32_RE.match(trace_id) and trace_id != INVALID_TRACE_ID:
+        span_id = _header(headers, 'x-parent-span-id')
+        if not (span_id and HEX16_RE.match(span_id)):
+            span_id = None
+        return SpanContext(trace_id, span_id)
+
+    return None
+
+
+def format_traceparent(span):
+    """Cabecera traceparent para propagar el span a otro servicio"""
+    return f'00-{span.trace_id}-{span.span_id}-01'
+
+
+class Span:
+    """Span con tiempos en nanosegundos desde epoch"""
+
+    __slots__ = (
+        'name', 'trace_id', 'span_id', 'parent_id', 'start_ns', 'end_ns',
+        'attributes', 'status', 'error', '_tracer'
+    )
+
+    def __init__(self, tracer, name, trace_id, parent_id=None, start_ns=None, attributes=None):
+        self._tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.status = 'OK'
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_error(self, error):
+        self.status = 'ERROR'
+        self.error = str(error)
+
+    def end(self, end_ns=None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = end_ns if end_ns is not None else time.time_ns()
+        self._tracer.processor.on_end(self)
+
+    @property
+    def duration_ms(self):
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self):
+        """Span en codificación OTLP/JSON"""
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent_id or '',
+            'name': self.name,
+            'kind': 1,  # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns if self.end_ns is not None else self.start_ns),
+            'attributes': key_values(self.attributes),
+            'status': {'code': STATUS_CODES.get(self.status, 0)}
+        }
+        if self.error:
+            span['status']['message'] = self.error
+        return span
+
+
+class Tracer:
+    """Crea spans y los entrega al procesador de lotes"""
+
+    def __init__(self, processor, service_name='sms'):
+        self.processor = processor
+        self.service_name = service_name
+
+    def start_trace(self, name, headers=None, attributes=None):
+        """Span raíz del mensaje: hijo del productor o traza nueva"""
+        ctx = extract(headers)
+        if ctx:
+            return Span(self, name, ctx.trace_id, ctx.span_id, attributes=attributes)
+        return Span(self, name, secrets.token_hex(16), attributes=attributes)
+
+    def record(self, name, start_ns, end_ns, parent, attributes=None):
+        """Registrar un span con tiempos ya conocidos (p. ej. espera en cola)"""
+        span = Span(self, name, parent.trace_id, parent.span_id, start_ns, attributes)
+        span.end(end_ns)
+        return span
+
+    @contextlib.contextmanager
+    def activate(self, span):
+        """Fijar el span como padre de los spans creados dentro del bloque"""
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """Span hijo del span activo (o raíz si no hay ninguno)"""
+        parent = _current_span.get()
+        if parent is None:
+            span = Span(self, name, secrets.token_hex(16), attributes=attributes)
+        else:
+            span = Span(self, name, parent.trace_id, parent.span_id, attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+
+def current_span():
+    return _current_span.get()
+
+
+# ======================================================
+# Exportadores
+# ======================================================
+
+class SpanExporter:
+    """Interfaz de exportación de lotes de spans"""
+
+    def export(self, spans):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+
+class NoopExporter(SpanExporter):
+    def export(self, spans):
+        pass
+
+
+class JsonlFileExporter(SpanExporter):
+    """Escribe cada lote como una línea OTLP/JSON (resourceSpans)"""
+
+    def __init__(self, path, service_name='sms'):
+        self.path = path
+        self.service_name = service_name
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        record = {
+            'resourceSpans': [{
+                'resource': {'attributes': key_values({'service.name': self.service_name})},
+                'scopeSpans': [{
+                    'scope': {'name': 'sms.consumer'},
+                    'spans': [span.to_dict() for span in spans]
+                }]
+            }]
+        }
+        line = json.dumps(record, default=str, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+
+class BatchSpanProcessor:
+    """Acumula spans terminados y los exporta en lotes desde un hilo aparte"""
+
+    def __init__(self, exporter, max_batch_size=256, flush_interval=2.0, max_queue_size=8192):
+        self.exporter = exporter
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue = collections.deque(maxlen=max_queue_size)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._worker = None
+        self._enabled = not isinstance(exporter, NoopExporter)
+
+    def on_end(self, span):
+        if not self._enabled or self._stopped:
+            return
+        with self._lock:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(span)
+            size = len(self._queue)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='sms-span-exporter', daemon=True)
+                self._worker.start()
+        if size >= self.max_batch_size:
+            self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        while True:
+            with self._lock:
+                if not self._queue:
+                    return
+                batch = [self._queue.popleft() for _ in range(min(self.max_batch_size, len(self._queue)))]
+            try:
+                self.exporter.export(batch)
+            except Exception:
+                # La exportación nunca debe afectar el procesamiento de mensajes
+                self.dropped += len(batch)
+
+    def shutdown(self):
+        self._stopped = True
+        self._wakeup.set()
+        self.flush()
+        self.exporter.shutdown()
+
+
+def exporter_from_env():
+    """Crear el exportador según SMS_TRACE_EXPORTER (none | jsonl)"""
+    kind = os.environ.get('SMS_TRACE_EXPORTER', 'none').lower()
+    if kind in ('jsonl', 'otlp-file', 'file'):
+        return JsonlFileExporter(os.environ.get('SMS_TRACE_FILE', 'traces.jsonl'))
+    return NoopExporter()
+
+
+processor = BatchSpanProcessor(
+    exporter_from_env(),
+    max_batch_size=int(os.environ.get('SMS_TRACE_BATCH_SIZE', '256')),
+    flush_interval=float(os.environ.get('SMS_TRACE_FLUSH_INTERVAL', '2.0'))
+)
+tracer = Tracer(processor)
+atexit.register(processor.shutdown)